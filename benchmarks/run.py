@@ -0,0 +1,155 @@
+"""
+.. run.py
+
+Run the benchmark suite, and optionally record its results as a baseline or
+compare them against one::
+
+    python benchmarks/run.py
+    python benchmarks/run.py --save benchmarks/baseline.json
+    python benchmarks/run.py --compare benchmarks/baseline.json
+    python benchmarks/run.py ndk risk
+
+Positional arguments select the workloads whose names contain any of them.
+Every run of a workload is a fresh process, which reports the time of the
+workload and the peak resident memory (``ru_maxrss``) of the process, as well
+as by how much the workload raised that peak. The time of a workload is the
+minimum over its runs.
+
+With ``--compare``, the exit status is 1 if any workload regressed by more
+than the tolerance.
+"""
+
+## Python basics
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+## Measurements
+import resource
+import subprocess
+import timeit
+
+## Command line and results
+import argparse
+import json
+import platform
+
+
+## Differences below these are noise, whatever the tolerance is
+MIN_TIME = 0.002
+MIN_KB = 1024
+
+
+def _maxrss():
+    """ Return the peak resident memory of this process, in KB. """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ## macOS reports bytes
+    if sys.platform == 'darwin':
+        rss //= 1024
+    return rss
+
+
+def measure(name):
+    """ Run the workload *name* in this process, and return its
+    measurements. """
+    import workloads
+    func = workloads.workloads[name]
+    before = _maxrss()
+    start = timeit.default_timer()
+    func()
+    elapsed = timeit.default_timer() - start
+    after = _maxrss()
+    return {'time': elapsed, 'peak_kb': after, 'extra_kb': after - before}
+
+
+def run(name, repeat):
+    """ Run the workload *name* *repeat* times, each in a fresh process, and
+    return its best measurements. """
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, __file__, '--worker',
+                                       name])
+        runs.append(json.loads(out.decode('utf-8')))
+    return {'time': min(r['time'] for r in runs),
+            'peak_kb': min(r['peak_kb'] for r in runs),
+            'extra_kb': min(r['extra_kb'] for r in runs)}
+
+
+def regressions(result, base, tolerance):
+    """ Return the list of measures in which *result* is worse than *base* by
+    more than *tolerance* (a fraction). """
+    res = []
+    if result['time'] > max(base['time'] * (1 + tolerance),
+                            base['time'] + MIN_TIME):
+        res.append('time')
+    if result['extra_kb'] > max(base['extra_kb'] * (1 + tolerance),
+                                base['extra_kb'] + MIN_KB):
+        res.append('memory')
+    return res
+
+
+def _row(name, result, base, regressed):
+    line = "{:<42} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+        name, result['time'] * 1000, result['peak_kb'] / 1024.,
+        result['extra_kb'] / 1024.)
+    if base is not None:
+        line += " {:>8.2f}x".format(result['time'] / max(base['time'], 1e-9))
+        if regressed:
+            line += "  REGRESSED ({})".format(", ".join(regressed))
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the benchmark suite.")
+    parser.add_argument('select', nargs='*',
+                        help="run only workloads whose names contain these")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="number of runs of each workload")
+    parser.add_argument('--save', metavar='FILE',
+                        help="save the results as a baseline")
+    parser.add_argument('--compare', metavar='FILE',
+                        help="compare the results against a baseline")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="allowed slowdown, as a fraction")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        sys.stdout.write(json.dumps(measure(args.worker)))
+        return 0
+
+    import workloads
+    names = [name for name in workloads.workloads
+             if not args.select or any(s in name for s in args.select)]
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    print("{:<42} {:>10} {:>10} {:>10}".format('workload', 'time (ms)',
+                                                'peak (MB)', 'extra (MB)'))
+    results = {}
+    failed = False
+    for name in names:
+        result = results[name] = run(name, args.repeat)
+        base = baseline.get(name)
+        regressed = base and regressions(result, base, args.tolerance)
+        failed = failed or bool(regressed)
+        print(_row(name, result, base, regressed))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'results': results}, f, indent=2, sort_keys=True,
+                      separators=(',', ': '))
+            f.write('\n')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+.. workloads.py
+
+The fixed workloads of the benchmark suite. A workload is a function of no
+arguments, which is timed as a whole, in a fresh process (so memoization
+caches are cold).
+"""
+
+## Framework
+import drv.core
+import drv.dice.base
+import drv.dice.risk
+import drv.rpg.d20
+import drv.rpg.systems.cortex_plus
+
+## Data containers
+import collections as col
+
+## Python basics
+import functools as fn
+
+
+## Sugar
+DRV = drv.core.DiscreteRandomVariable
+POOL = drv.core.RandomVariablePool
+dk = drv.dice.base.dk
+ndk = drv.dice.base.ndk
+
+
+## Workloads by name, in the order they are run
+workloads = col.OrderedDict()
+
+
+###########################
+## ----- Workloads ----- ##
+###########################
+
+## Sums of dice
+for n, k in [(2, 6), (10, 6), (50, 6), (10, 20), (40, 20)]:
+    workloads['ndk/{}d{}'.format(n, k)] = fn.partial(ndk, n, k)
+
+
+## Roll and keep on Cortex pools
+def _cortex(*dice):
+    pool = POOL(*(drv.rpg.systems.cortex_plus.dk(k) for k in dice))
+    return pool.nlargest_sum(2, 'cortex')
+
+
+for dice in [(8, 6, 6), (12, 10, 8, 6, 4), (12, 12, 10, 10, 8, 8, 6, 6)]:
+    name = 'nlargest_sum/' + ','.join('d{}'.format(k) for k in dice)
+    workloads[name] = fn.partial(_cortex, *dice)
+
+
+def _risk_attacks():
+    return [drv.dice.risk.attack(a, d) for a in (1, 2, 3) for d in (1, 2)]
+
+
+workloads['risk.attack/all'] = _risk_attacks
+
+
+def _opposed_tests():
+    return [drv.rpg.d20.opposed_test(a, b)
+            for a in (0, 5, 10) for b in (-2, 3, 8)]
+
+
+workloads['d20.opposed_test/9'] = _opposed_tests
+
+
+## Sampling throughput
+def _rolls(n):
+    return ndk(3, 6).roll(n)
+
+
+workloads['roll/3d6x10000'] = fn.partial(_rolls, 10 ** 4)
+
+
+## Construction
+def _construct_xp(n):
+    return DRV('x', xs=range(n), ps=[1. / n] * n)
+
+
+def _construct_dice(n):
+    return [dk(6) for _ in xrange(n)]
+
+
+workloads['construct/xs-ps-100000'] = fn.partial(_construct_xp, 10 ** 5)
+workloads['construct/d6x1000'] = fn.partial(_construct_dice, 1000)
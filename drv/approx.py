@@ -0,0 +1,379 @@
+"""
+.. approx.py
+
+Approximate discrete random variables; these track only the first four
+cumulants of an integer-valued random variable (together with its exact
+bounds and lattice), and answer probability queries by a normal approximation
+or an Edgeworth expansion.
+
+Cumulants are additive for sums of independent random variables, so very large
+sums (such as 10000d6) cost as much as a single die. Approximation is opt-in:
+once ``drv.core.max_exact_support`` is set, operators which support
+approximation switch to it when their (estimated) exact support would exceed
+it. Operators which do not support approximation (such as comparisons) are
+computed exactly on the lattice of an approximate random variable.
+"""
+
+## Framework
+import drv.core
+
+## Math
+import numpy as np
+
+## Python basics
+import fractions
+
+
+## The default approximation method; either 'normal' or 'edgeworth'
+method = 'edgeworth'
+
+
+##################################
+## ----- Helper Functions ----- ##
+##################################
+
+def _gcd(a, b):
+    return abs(fractions.gcd(int(a), int(b)))
+
+
+def _phi(z):
+    """ The standard normal density. """
+    return np.exp(-0.5 * z ** 2) / np.sqrt(2 * np.pi)
+
+
+def _Phi(z):
+    """ The standard normal cumulative distribution function. """
+    import scipy.special as sp
+    return 0.5 * sp.erfc(-z / np.sqrt(2))
+
+
+def cumulants(rv):
+    """ Return the array of the first four cumulants of the random variable
+    *rv*. """
+    if isinstance(rv, ApproximateDiscreteRandomVariable):
+        return rv.cumulants
+    xs = np.asarray(rv.xs, dtype=float)
+    ps = np.asarray(rv.ps, dtype=float)
+    mean = np.dot(xs, ps)
+    mu2, mu3, mu4 = [np.dot((xs - mean) ** n, ps) for n in (2, 3, 4)]
+    return np.array([mean, mu2, mu3, mu4 - 3 * mu2 ** 2])
+
+
+def lattice(rv):
+    """ Return the pair (origin, step) of the lattice on which the values of
+    *rv* lie; the step of a constant is 0. """
+    if isinstance(rv, ApproximateDiscreteRandomVariable):
+        return rv.origin, rv.step
+    xs = np.asarray(rv.xs, dtype=int)
+    return xs.min(), reduce(_gcd, xs - xs.min(), 0)
+
+
+def approximate(rv, name=None):
+    """ Return the approximate random variable of the random variable *rv*.
+    """
+    origin, step = lattice(rv)
+    return ApproximateDiscreteRandomVariable(name or rv.name, cumulants(rv),
+                                             rv.min, rv.max, origin, step)
+
+
+#############################
+## ----- Propagation ----- ##
+#############################
+
+## Each rule gets the random variables of a pool and returns the arguments of
+## their approximate result (cumulants, bounds and lattice), or None if the
+## rule does not apply.
+
+_SIGNS = np.array([-1, 1, -1, 1])
+
+
+def _sum_rule(rvs):
+    ks = np.sum([cumulants(rv) for rv in rvs], axis=0)
+    low = sum(rv.min for rv in rvs)
+    high = sum(rv.max for rv in rvs)
+    lats = [lattice(rv) for rv in rvs]
+    origin = sum(o for o, _ in lats)
+    step = reduce(_gcd, (s for _, s in lats), 0)
+    return ks, low, high, origin, step
+
+
+def _neg_rule(rvs):
+    rv = rvs[0]
+    origin, step = lattice(rv)
+    return cumulants(rv) * _SIGNS, -rv.max, -rv.min, -origin, step
+
+
+def _sub_rule(rvs):
+    a, b = rvs
+    ks, low, high, origin, step = _neg_rule([b])
+    return _sum_rule([a, ApproximateDiscreteRandomVariable(
+        '', ks, low, high, origin, step)])
+
+
+def _mul_rule(rvs):
+    ## Only a multiplication by constants is supported
+    nonconst = [rv for rv in rvs if rv.min != rv.max]
+    if len(nonconst) != 1:
+        return None
+    rv = nonconst[0]
+    c = reduce(lambda a, b: a * b, (r.min for r in rvs if r.min == r.max), 1)
+    origin, step = lattice(rv)
+    ks = cumulants(rv) * c ** np.arange(1, 5)
+    low, high = sorted([rv.min * c, rv.max * c])
+    return ks, low, high, origin * c, step * abs(c)
+
+
+rules = {
+    'sum': _sum_rule,
+    'neg': _neg_rule,
+    'sub': _sub_rule,
+    'mul': _mul_rule,
+}
+
+
+def support_estimate(kind, rvs):
+    """ Return an estimate of the size of the exact support of the result of
+    an operator of the given *kind* on *rvs*. """
+    if kind in ('sum', 'sub'):
+        return sum(rv.max - rv.min for rv in rvs) + 1
+    return max(rv.max - rv.min for rv in rvs) + 1
+
+
+def is_approximate(pool):
+    """ Return whether any of the random variables of *pool* is approximate.
+    """
+    return any(isinstance(rv, ApproximateDiscreteRandomVariable)
+               for rv in pool.drvs)
+
+
+def discretized(pool):
+    """ Return the pool of the random variables of *pool*, where approximate
+    random variables are replaced by their discretizations. """
+    return drv.core.RandomVariablePool(*(
+        rv.discretize() if isinstance(rv, ApproximateDiscreteRandomVariable)
+        else rv for rv in pool.drvs))
+
+
+def propagate(kind, pool, name):
+    """ Return the approximate result of an operator of the given *kind* on
+    *pool*, or None if it should be computed exactly. """
+    rvs = pool.drvs
+    approx = is_approximate(pool)
+    limit = drv.core.max_exact_support
+    if not approx:
+        if limit is None or support_estimate(kind, rvs) <= limit:
+            return None
+
+    args = rules[kind](rvs)
+    if args is None:
+        return None
+
+    formatter = dict(("_{i}".format(i=i), rv) for i, rv in enumerate(rvs))
+    return ApproximateDiscreteRandomVariable(name.format(**formatter), *args)
+
+
+##############################
+## ----- Main Classes ----- ##
+##############################
+
+class ApproximateDiscreteRandomVariable(drv.core.BaseDiscreteRandomVariable):
+    """ An ``ApproximateDiscreteRandomVariable`` is an integer-valued discrete
+    random variable which is known only by its first four cumulants, its exact
+    bounds and the lattice its values lie on. """
+    def __init__(self, name, cumulants, low, high, origin, step, method=None):
+        self.name = name
+        self.cumulants = np.asarray(cumulants, dtype=float)
+        self.low = low
+        self.high = high
+        self.origin = origin
+        self.step = step
+        self.method = method
+
+    ## ----- Roll Methods ----- ##
+
+    def _roll(self):
+        """ Return a result of a single roll. """
+        x = np.random.normal(self.mean, self.std)
+        return int(self._floor(np.clip(x + self.step / 2., self.low,
+                                       self.high)))
+
+    ## ----- Probability Methods ----- ##
+
+    def _floor(self, k):
+        """ Return the largest lattice point which is at most *k*. """
+        step = self.step or 1
+        m = np.floor((np.asarray(k) - self.origin) / float(step))
+        return self.origin + m * step
+
+    def _correction(self, z):
+        """ Return the correction of the standard normal CDF at *z* of the
+        approximation (which is 0 for the normal approximation). """
+        if (self.method or method) != 'edgeworth':
+            return 0.0
+        g1 = self.cumulants[2] / self.std ** 3
+        g2 = self.cumulants[3] / self.std ** 4
+        he2 = z ** 2 - 1
+        he3 = z ** 3 - 3 * z
+        he5 = z ** 5 - 10 * z ** 3 + 15 * z
+        return -_phi(z) * (g1 / 6 * he2 + g2 / 24 * he3 + g1 ** 2 / 72 * he5)
+
+    def _standard_cdf(self, z):
+        """ Return the approximate CDF of the standardized variable. """
+        return np.clip(_Phi(z) + self._correction(z), 0.0, 1.0)
+
+    def _standard_sf(self, z):
+        """ Return the approximate survival function of the standardized
+        variable; it is computed from the upper tail (rather than as one minus
+        the CDF), so small tail probabilities are not lost. """
+        return np.clip(_Phi(-z) - self._correction(z), 0.0, 1.0)
+
+    def _tail(self, k, upper):
+        """ Return the CDF (or the survival function, if *upper*) at *k*. """
+        k = np.asarray(k, dtype=float)
+        x = self._floor(k)
+        if self.std > 0:
+            z = (x + self.step / 2. - self.mean) / self.std
+            res = self._standard_sf(z) if upper else self._standard_cdf(z)
+        else:
+            res = ((x < self.mean) if upper else (x >= self.mean)).astype(float)
+        below, above = (1.0, 0.0) if upper else (0.0, 1.0)
+        res = np.where(k < self.low, below,
+                       np.where(k >= self.high, above, res))
+        return res[()]
+
+    def cdf(self, k):
+        """ Return the cumulative distribution function at *k*. """
+        return self._tail(k, upper=False)
+
+    def pmf(self, k):
+        """ Return the probability mass function at *k*. """
+        k = np.asarray(k, dtype=float)
+        on_lattice = self._floor(k) == k
+        res = self.cdf(k) - self.cdf(k - max(self.step, 1))
+        return np.where(on_lattice, np.clip(res, 0.0, 1.0), 0.0)[()]
+
+    def pr(self, event):
+        """ Return the probability of *event*, a boolean function of the value
+        of the random variable. """
+        return self.discretize().pr(event)
+
+    def sf(self, k):
+        """ Return the survival function at *k*. """
+        return self._tail(k, upper=True)
+
+    ## ----- Probability Inverse Methods ----- ##
+
+    def _ppf(self, q):
+        """ Return the smallest lattice point whose CDF is at least *q*. """
+        if q <= 0:
+            return self.low
+        if q >= 1:
+            return self.high
+        ## Initial guess by the Cornish-Fisher expansion
+        import scipy.special as sp
+        z = np.sqrt(2) * sp.erfinv(2 * q - 1)
+        if (self.method or method) == 'edgeworth' and self.std > 0:
+            g1 = self.cumulants[2] / self.std ** 3
+            g2 = self.cumulants[3] / self.std ** 4
+            z += ((z ** 2 - 1) * g1 / 6 + (z ** 3 - 3 * z) * g2 / 24 -
+                  (2 * z ** 3 - 5 * z) * g1 ** 2 / 36)
+        step = max(self.step, 1)
+        x = self._floor(np.clip(self.mean + self.std * z, self.low,
+                                self.high))
+        while x < self.high and self.cdf(x) < q:
+            x += step
+        while x > self.low and self.cdf(x - step) >= q:
+            x -= step
+        return x
+
+    def isf(self, q):
+        """ Return the inverse survival function at *q*. """
+        return self.ppf(1 - np.asarray(q))
+
+    def ppf(self, q):
+        """ Return the percent point function (inverse CDF) at *q*. """
+        return np.vectorize(self._ppf, otypes=[float])(q)[()]
+
+    ## ----- Probability Log Methods ----- ##
+
+    def logcdf(self, k):
+        """ Return the log of the cumulative distribution function at *k*. """
+        return np.log(self.cdf(k))
+
+    def logpmf(self, k):
+        """ Return the log of the probability mass function at *k*. """
+        return np.log(self.pmf(k))
+
+    def logsf(self, k):
+        """ Return the log of the survival function at *k*. """
+        return np.log(self.sf(k))
+
+    ## ----- Probability Properties ----- ##
+
+    @property
+    def max(self):
+        """ The maximum value of the random variable. """
+        return self.high
+
+    @property
+    def mean(self):
+        """ The mean of the random variable. """
+        return self.cumulants[0]
+
+    @property
+    def median(self):
+        """ The median of the random variable. """
+        return self.ppf(0.5)
+
+    @property
+    def min(self):
+        """ The minimum value of the random variable. """
+        return self.low
+
+    @property
+    def std(self):
+        """ The standard deviation of the random variable. """
+        return np.sqrt(self.cumulants[1])
+
+    @property
+    def variance(self):
+        """ The variance of the random variable. """
+        return self.cumulants[1]
+
+    ## ----- Discretization ----- ##
+
+    @property
+    def xs(self):
+        """ The lattice points between the bounds of the random variable. """
+        return np.arange(self.low, self.high + 1, max(self.step, 1),
+                         dtype=int)
+
+    @property
+    def ps(self):
+        """ The (approximate) probabilities of the values :attr:`xs`. """
+        ps = np.atleast_1d(self.pmf(self.xs))
+        return ps / ps.sum()
+
+    def discretize(self, name=None):
+        """ Return the (exact) discrete random variable whose values and
+        probabilities are :attr:`xs` and :attr:`ps`. """
+        return drv.core.DiscreteRandomVariable(name or self.name, xs=self.xs,
+                                               ps=self.ps)
+
+    ## ----- Arithmetic ----- ##
+
+    def unop(self, operator, name):
+        """ Return a new random variable, which is the result of *operator* on
+        *self*. """
+        pool = drv.core.RandomVariablePool(self)
+        return operator(pool, name)
+
+    def binop(self, other, operator, name):
+        """ Return a new random variable, which is the result of *operator* on
+        *self* and *other*. *other* may be an integer, in which case we treat
+        it as a constant random variable. """
+        if isinstance(other, int):
+            other = drv.core.constant(other)
+
+        pool = drv.core.RandomVariablePool(self, other)
+        return operator(pool, name)
@@ -0,0 +1,241 @@
+"""
+.. cache.py
+
+A persistent, size-bounded cache of operator results, which is shared by all
+processes using the same cache file.
+
+The cache is an SQLite database, whose rows are the values and probabilities
+of results (as raw array blobs), keyed by a fingerprint of the operator and of
+its operands. It is disabled by default; once enabled (with :func:`enable`),
+every operator call -- and hence ``ndk``, the pool methods, and so on --
+consults it before computing, except for calls on pools which are small
+enough to compute directly (see ``drv.core.max_direct_tuples``).
+
+Operators are fingerprinted by their attributes; functions are fingerprinted
+by their code, defaults and closures, and by the values of the globals their
+code names (recursively, for global functions). Globals whose ``repr`` is not
+stable (such as most instances) only cause cache misses, never stale results;
+attributes of imported modules are not followed.
+"""
+
+## Framework
+import drv.core
+
+## Math
+import numpy as np
+
+## Storage
+import hashlib
+import os
+import sqlite3
+import time
+import types
+
+
+## The active cache, if any
+_cache = None
+
+
+##############################
+## ----- Fingerprints ----- ##
+##############################
+
+def _code_fingerprint(code):
+    """ Return a string which identifies the code object *code*. """
+    consts = [_code_fingerprint(c) if isinstance(c, types.CodeType) else
+              repr(c) for c in code.co_consts]
+    return repr((code.co_code, consts, code.co_names, code.co_varnames))
+
+
+def _code_names(code):
+    """ Return the set of names used by the code object *code* and by the code
+    objects nested in it. """
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if isinstance(c, types.CodeType):
+            names |= _code_names(c)
+    return names
+
+
+def _fingerprint(obj, seen=None):
+    """ Return a string which identifies *obj*, where *obj* may be a function
+    (identified by its code, defaults, closure and the globals it uses), an
+    array, or any object with a stable ``repr``. """
+    seen = set() if seen is None else seen
+    if isinstance(obj, types.FunctionType):
+        if id(obj) in seen:
+            return repr((obj.__module__, obj.__name__))
+        seen.add(id(obj))
+        closure = [_fingerprint(cell.cell_contents, seen)
+                   for cell in obj.__closure__ or ()]
+        defaults = [_fingerprint(d, seen) for d in obj.__defaults__ or ()]
+        globs = [(name, _fingerprint(obj.__globals__[name], seen))
+                 for name in sorted(_code_names(obj.__code__))
+                 if name in obj.__globals__]
+        return repr((obj.__module__, obj.__name__,
+                     _code_fingerprint(obj.__code__), defaults, closure,
+                     globs))
+    if isinstance(obj, np.ndarray):
+        return repr((obj.dtype.str, obj.shape,
+                     hashlib.sha1(np.ascontiguousarray(obj)).hexdigest()))
+    if isinstance(obj, (list, tuple)):
+        return repr([_fingerprint(o, seen) for o in obj])
+    return repr(obj)
+
+
+def fingerprint(operator, pool):
+    """ Return the key of the result of *operator* on *pool*. """
+    h = hashlib.sha1()
+    h.update(type(operator).__name__.encode('utf-8'))
+    for attr, value in sorted(vars(operator).items()):
+        h.update(repr((attr, _fingerprint(value))).encode('utf-8'))
+    for rv in pool.drvs:
+        h.update(np.asarray(rv.xs, dtype=np.int64).tostring())
+        h.update(np.asarray(rv.ps, dtype=float).tostring())
+    return h.hexdigest()
+
+
+###########################
+## ----- The Cache ----- ##
+###########################
+
+class DiskCache(object):
+    """ A ``DiskCache`` is an SQLite-backed cache of at most *max_bytes* bytes
+    of arrays; the least recently used results are evicted first. """
+    def __init__(self, path, max_bytes=2 ** 30, timeout=60.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._pid = None
+        self._connection = None
+        with self._transaction() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS results ("
+                       "key TEXT PRIMARY KEY, xs BLOB, ps BLOB, "
+                       "size INTEGER, accessed REAL)")
+            db.execute("CREATE INDEX IF NOT EXISTS results_accessed "
+                       "ON results (accessed)")
+
+    @property
+    def db(self):
+        """ The connection of the current process; a forked child opens its
+        own connection. """
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path,
+                                               timeout=self.timeout,
+                                               isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    def _transaction(self):
+        return _Transaction(self.db)
+
+    def get(self, key):
+        """ Return the pair of arrays (xs, ps) stored under *key*, or None.
+        """
+        row = self.db.execute("SELECT xs, ps FROM results WHERE key = ?",
+                              (key,)).fetchone()
+        if row is None:
+            return None
+        ## The access time is only a hint; never wait for it
+        self.db.execute("PRAGMA busy_timeout = 0")
+        try:
+            self.db.execute("UPDATE results SET accessed = ? WHERE key = ?",
+                            (time.time(), key))
+        except sqlite3.OperationalError:
+            pass
+        finally:
+            self.db.execute("PRAGMA busy_timeout = {:d}".format(
+                int(self.timeout * 1000)))
+        return (np.frombuffer(bytes(row[0]), dtype=np.int64),
+                np.frombuffer(bytes(row[1]), dtype=float))
+
+    def put(self, key, xs, ps):
+        """ Store the arrays *xs* and *ps* under *key*, and evict the least
+        recently used results if the cache is too large. """
+        xs = np.asarray(xs, dtype=np.int64).tostring()
+        ps = np.asarray(ps, dtype=float).tostring()
+        size = len(xs) + len(ps)
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                       (key, sqlite3.Binary(xs), sqlite3.Binary(ps), size,
+                        time.time()))
+            total, = db.execute("SELECT SUM(size) FROM results").fetchone()
+            excess = total - self.max_bytes
+            if excess <= 0:
+                return
+            stale = []
+            for old_key, old_size in db.execute(
+                    "SELECT key, size FROM results ORDER BY accessed"):
+                if excess <= 0:
+                    break
+                stale.append((old_key,))
+                excess -= old_size
+            db.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def clear(self):
+        """ Remove all results. """
+        with self._transaction() as db:
+            db.execute("DELETE FROM results")
+
+
+class _Transaction(object):
+    """ A context manager of a write transaction, which locks the database
+    immediately, so concurrent writers wait rather than fail. """
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+##############################
+## ----- Entry Points ----- ##
+##############################
+
+def enable(path, max_bytes=2 ** 30):
+    """ Enable the cache, backed by the file *path*, bounded by *max_bytes*
+    bytes. """
+    global _cache
+    _cache = DiskCache(path, max_bytes=max_bytes)
+    return _cache
+
+
+def disable():
+    """ Disable the cache. """
+    global _cache
+    _cache = None
+
+
+def call(operator, pool, name):
+    """ Return the result of *operator* on *pool*, named *name*, through the
+    cache (if enabled). """
+    import drv.instrument
+    import drv.planner
+    if _cache is None:
+        return drv.planner.execute(operator, pool, name)
+
+    key = fingerprint(operator, pool)
+    hit = _cache.get(key)
+    if hit is not None:
+        drv.instrument.note(kernel='cache', cache='hit')
+        formatter = dict(("_{i}".format(i=i), rv)
+                         for i, rv in enumerate(pool.drvs))
+        xs, ps = hit
+        res = drv.core.DiscreteRandomVariable(name.format(**formatter),
+                                              xs=xs, ps=ps, presorted=True)
+        res.plan = drv.core.Plan('cache', None, None, "found in the cache")
+        return res
+
+    drv.instrument.note(cache='miss')
+    res = drv.planner.execute(operator, pool, name)
+    ## Monte Carlo estimates are not worth keeping
+    plan = getattr(res, 'plan', None)
+    if isinstance(res, drv.core.DiscreteRandomVariable) and \
+            (plan is None or plan.kernel != 'monte_carlo'):
+        _cache.put(key, res.xs, res.ps)
+    return res
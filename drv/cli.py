@@ -0,0 +1,290 @@
+"""
+.. cli.py
+
+The ``drv`` command, which answers a stream of queries, given as JSON lines
+(one JSON object per line), with a stream of JSON lines::
+
+    $ echo '{"id": 1, "expr": "4d6kh3", "stats": ["mean", ["sf", 15]]}' | drv
+    {"id": 1, "stats": {"mean": 12.24..., "sf(15)": 0.13...}}
+
+A query has either an ``expr`` -- a dice expression (see
+:mod:`drv.notation`) -- or a ``call`` -- a function of the library, such as
+``risk.attack`` or ``misc.test``, which is looked up in :mod:`drv.dice`
+and in :mod:`drv.rpg`, with its ``args`` and ``kwargs``. Its
+``stats`` are a list of statistics; either names of properties of random
+variables (``mean``, ``std``, ``variance``, ``min``, ``max``, ``median``,
+``entropy``, ``xs`` or ``ps``), or pairs of a method name (``pmf``, ``cdf``,
+``sf``, ``ppf`` or ``isf``) and its argument. Its ``id``, if any, is echoed.
+A query which fails is answered with an ``error``. The numbers of the
+``args`` and ``kwargs`` of a ``call`` are at most ``max_argument`` in absolute
+value, and ``expr`` is limited as described in :mod:`drv.notation`, so
+untrusted queries may be answered.
+
+Queries are read in batches -- of ``--batch`` queries, or fewer, if no more
+input arrives within ``--idle`` seconds (so an interactive pipe is answered
+right away); the distinct queries of a batch which are not memoized are
+answered in a pool of processes, and the answers are written in the order of
+the queries. Answers are memoized, but errors are not. With ``--cache``, the
+workers use a persistent cache of operator results (see :mod:`drv.cache`),
+which is shared by all of them and by later runs.
+"""
+
+## Framework
+import drv.notation
+
+## Data containers
+import collections as col
+
+## Command line
+import argparse
+import importlib
+import json
+import multiprocessing as mp
+import os
+import select
+import stat
+import sys
+
+
+## Default statistics of a query
+DEFAULT_STATS = ['mean', 'std', 'min', 'max']
+
+## Statistics which are properties of random variables, and methods of one
+## argument
+PROPERTIES = ('mean', 'std', 'variance', 'min', 'max', 'median', 'entropy',
+              'xs', 'ps')
+METHODS = ('pmf', 'cdf', 'sf', 'ppf', 'isf')
+
+## Packages in which functions are looked up
+PACKAGES = ('drv.dice', 'drv.rpg')
+
+## The largest absolute value of a number in the arguments of a function
+max_argument = max(drv.notation.max_count, drv.notation.max_sides)
+
+
+#########################
+## ----- Queries ----- ##
+#########################
+
+def _json(value):
+    """ Return *value* (a number, or a sequence of numbers, possibly of NumPy
+    types) as a JSON-able object. """
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_json(v) for v in value]
+    return value
+
+
+def _function(name):
+    """ Return the public function *name* (a dotted path, relative to one of
+    the ``PACKAGES``). """
+    module, _, attr = name.rpartition('.')
+    if not module or attr.startswith('_'):
+        raise ValueError("Unknown function {}.".format(name))
+    for package in PACKAGES:
+        try:
+            mod = importlib.import_module("{}.{}".format(package, module))
+        except ImportError:
+            continue
+        func = getattr(mod, attr, None)
+        if callable(func):
+            return func
+    raise ValueError("Unknown function {}.".format(name))
+
+
+def _check_arguments(value):
+    """ Make sure that the numbers of *value* (arguments of a function, as
+    decoded from JSON) are at most ``max_argument`` in absolute value. """
+    if isinstance(value, dict):
+        value = value.values()
+    if isinstance(value, list):
+        for v in value:
+            _check_arguments(v)
+    elif isinstance(value, (int, long, float)) and abs(value) > max_argument:
+        raise ValueError("Arguments may be at most {} in absolute "
+                         "value.".format(max_argument))
+
+
+def _drv(query):
+    """ Return the random variable of *query*. """
+    if 'expr' in query:
+        return drv.notation.evaluate(query['expr'])
+    if 'call' in query:
+        func = _function(query['call'])
+        args, kwargs = query.get('args', []), query.get('kwargs', {})
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise ValueError("args should be a list, and kwargs an object.")
+        _check_arguments([args, kwargs])
+        return func(*args, **kwargs)
+    raise ValueError("A query must have either an expr or a call.")
+
+
+def _stat(rv, stat):
+    """ Return the pair (label, value) of the statistic *stat* of *rv*. """
+    if stat in PROPERTIES:
+        return stat, _json(getattr(rv, stat))
+    if isinstance(stat, list) and len(stat) == 2 and stat[0] in METHODS:
+        method, arg = stat
+        label = "{}({})".format(method, json.dumps(arg))
+        return label, _json(getattr(rv, method)(arg))
+    raise ValueError("Unknown statistic {}.".format(json.dumps(stat)))
+
+
+def answer(query):
+    """ Return the answer to *query* (a dictionary), without its id. """
+    try:
+        rv = _drv(query)
+        stats = query.get('stats', DEFAULT_STATS)
+        return {'stats': dict(_stat(rv, stat) for stat in stats)}
+    except Exception as e:
+        return {'error': "{}: {}".format(type(e).__name__, e)}
+
+
+def _key(query):
+    """ Return the key by which *query* is deduplicated. """
+    query = dict(query)
+    query.pop('id', None)
+    if isinstance(query.get('expr'), basestring):
+        query['expr'] = drv.notation.normalize(query['expr'])
+    return json.dumps(query, sort_keys=True)
+
+
+def _parse(line):
+    """ Return the query of *line*, or the answer to it if it is invalid. """
+    try:
+        query = json.loads(line)
+    except ValueError as e:
+        return None, {'error': "Invalid JSON: {}".format(e)}
+    if not isinstance(query, dict):
+        return None, {'error': "A query must be a JSON object."}
+    return query, None
+
+
+###########################
+## ----- Streaming ----- ##
+###########################
+
+def _batches(lines, size, idle=None):
+    """ Yield lists of at most *size* non-blank lines of *lines*. If *idle* is
+    given, it is a function which returns whether no more lines are coming
+    soon, in which case the lines so far are yielded early. """
+    batch = []
+    for line in lines:
+        if line.strip():
+            batch.append(line)
+        if batch and (len(batch) >= size or (idle is not None and idle())):
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _idle(f, timeout):
+    """ Return a function which returns whether no input of the file object
+    *f* is ready within *timeout* seconds, or None if *f* is a regular file
+    (whose input is always ready). """
+    try:
+        if stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+            return None
+    except (AttributeError, ValueError, OSError):
+        return None
+    return lambda: not select.select([f], [], [], timeout)[0]
+
+
+def _initialize(cache):
+    if cache:
+        import drv.cache
+        drv.cache.enable(cache)
+
+
+def serve(lines, out, processes=None, batch=1000, cache=None,
+          memo_size=10 ** 5, idle=None):
+    """ Answer the queries of *lines* (an iterable of JSON lines), writing the
+    answers to the file object *out*. The distinct queries of every batch of
+    *batch* queries (or fewer, once *idle*, if given, returns True; see
+    :func:`_batches`) are answered in a pool of *processes* processes (or in
+    this process, if *processes* is 1), and the answers (but not the errors)
+    of the last *memo_size* distinct queries are memoized. """
+    memo = col.OrderedDict()
+    pool = None
+    if processes != 1:
+        pool = mp.Pool(processes, initializer=_initialize, initargs=(cache,))
+    else:
+        _initialize(cache)
+
+    try:
+        for chunk in _batches(lines, batch, idle):
+            parsed = [_parse(line) for line in chunk]
+            keys = [_key(query) if query is not None else None
+                    for query, _ in parsed]
+            todo = col.OrderedDict()
+            for key, (query, _) in zip(keys, parsed):
+                if key is not None and key not in memo:
+                    todo[key] = query
+            if pool is not None:
+                answers = pool.map(answer, todo.values())
+            else:
+                answers = [answer(query) for query in todo.values()]
+            answers = dict(zip(todo, answers))
+            ## Errors may be transient, so they are not memoized
+            memo.update((key, res) for key, res in answers.items()
+                        if 'error' not in res)
+
+            for key, (query, invalid) in zip(keys, parsed):
+                if key is None:
+                    res = invalid
+                else:
+                    res = answers[key] if key in answers else memo[key]
+                if query is not None and 'id' in query:
+                    res = dict(res, id=query['id'])
+                out.write(json.dumps(res, sort_keys=True) + '\n')
+            out.flush()
+
+            while len(memo) > memo_size:
+                memo.popitem(last=False)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='drv', description="Answer JSON lines queries about random "
+        "variables with JSON lines.")
+    parser.add_argument('input', nargs='?', default='-',
+                        help="the file of queries (default: stdin)")
+    parser.add_argument('-o', '--output', default='-',
+                        help="the file of answers (default: stdout)")
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help="number of worker processes (default: the "
+                        "number of CPUs)")
+    parser.add_argument('--batch', type=int, default=1000,
+                        help="largest number of queries read at a time")
+    parser.add_argument('--idle', type=float, default=0.05,
+                        help="seconds without input after which the queries "
+                        "read so far are answered")
+    parser.add_argument('--cache', metavar='FILE',
+                        help="a persistent cache of operator results")
+    parser.add_argument('--memo-size', type=int, default=10 ** 5,
+                        help="number of answers kept for deduplication")
+    args = parser.parse_args(argv)
+
+    lines = sys.stdin if args.input == '-' else open(args.input)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        ## Not iterating over the file itself, which reads ahead
+        serve(iter(lines.readline, ''), out, processes=args.processes,
+              batch=args.batch, cache=args.cache, memo_size=args.memo_size,
+              idle=_idle(lines, args.idle))
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,12 +5,10 @@ Discrete random variables; these are discrete (integer-valued) finite random
 variables.
 
 This module provides a simple (quite thin) wrapper around the extensive
-scipy.stats module.
+scipy.stats module. SciPy is imported only when needed, as importing it is
+slow.
 """
 
-## SciPy's random variable framework
-import scipy.stats as ss
-
 ## Math
 import numpy as np
 inf = np.inf
@@ -24,6 +22,7 @@ import collections as col
 ## Python basics
 import functools as fn
 import itertools as it
+import sys
 
 ## For arithmetic
 import operator as op
@@ -53,27 +52,334 @@ def unzip(zipped):
     return it.izip(*zipped)
 
 
+def memoize(func):
+    """ Return a memoized version of *func*, whose (positional) arguments must
+    be hashable. The cache is exposed as the ``cache`` attribute of the
+    returned function, so it may be inspected or cleared.
+
+    :param func: the function to memoize.
+    :type func: :term:`callable`
+    :rtype: :term:`callable`
+    """
+    cache = {}
+
+    @fn.wraps(func)
+    def helper(*args):
+        try:
+            return cache[args]
+        except KeyError:
+            res = cache[args] = func(*args)
+            return res
+
+    helper.cache = cache
+    return helper
+
+
+def bounded_memoize(size):
+    """ Return a decorator which memoizes a function, like :func:`memoize`,
+    but keeps only the results of its *size* most recent distinct arguments.
+
+    :param size: the maximal number of cached results.
+    :type size: :class:`int`
+    :rtype: :term:`callable`
+    """
+    def decorator(func):
+        cache = col.OrderedDict()
+
+        @fn.wraps(func)
+        def helper(*args):
+            try:
+                res = cache.pop(args)
+            except KeyError:
+                res = func(*args)
+            cache[args] = res
+            if len(cache) > size:
+                cache.popitem(last=False)
+            return res
+
+        helper.cache = cache
+        return helper
+    return decorator
+
+
+## Above this number of multiplications, convolve via FFT
+fft_threshold = 10 ** 5
+
+## The plan of an operator invocation: the kernel which computed it, its
+## estimated time (in seconds) and memory (in bytes), if known, and the reason
+## for choosing it (see :mod:`drv.planner`)
+Plan = col.namedtuple('Plan', 'kernel time memory reason')
+
+## The largest total number of probabilities of the convolution powers which
+## are cached on a random variable (see :func:`_dense_powers`)
+max_cached_powers = 10 ** 6
+
+## Up to this (estimated) number of enumerated tuples, operators compute their
+## results directly, without planning (see :mod:`drv.planner`) or caching (see
+## :mod:`drv.cache`), which cost more than such small pools
+max_direct_tuples = 10 ** 4
+
+## Above this (estimated) support size, operators which support it switch to
+## approximate random variables (see :mod:`drv.approx`); None (the default)
+## disables this, so results are exact unless approximation is asked for
+max_exact_support = None
+
+
+def _convolve(a, b):
+    """ Return the convolution of the 1-dimensional arrays *a* and *b*; large
+    convolutions are computed via FFT. """
+    if len(a) * len(b) <= fft_threshold:
+        return np.convolve(a, b)
+    import scipy.signal as sig
+    res = sig.fftconvolve(a, b)
+    ## Remove FFT noise around zero
+    res[res < 0] = 0.0
+    return res
+
+
+def _dense(drv):
+    """ Return the pair (offset, array) which represents the probabilities of
+    the integer-valued *drv* densely, such that ``array[i]`` is the
+    probability of ``offset + i``. """
+    xs = np.asarray(drv.xs, dtype=int)
+    offset = xs.min()
+    arr = np.zeros(xs.max() - offset + 1)
+    np.add.at(arr, xs - offset, drv.ps)
+    return offset, arr
+
+
+def _from_dense(name, offset, arr):
+    """ Return the random variable of the dense representation (*offset*,
+    *arr*); see :func:`_dense`. """
+    return DiscreteRandomVariable(name, xs=np.arange(len(arr)) + offset,
+                                  ps=arr)
+
+
+def _from_arrays(name, xs, ps):
+    """ Return the random variable whose sorted distinct values are *xs*, with
+    the (normalized) probabilities *ps*; the arrays are not copied. """
+    drv = DiscreteRandomVariable.__new__(DiscreteRandomVariable)
+    drv._initialize_with_arrays(name, xs, ps)
+    return drv
+
+
+def _iid_keep_sum(drv, n, m, highest=True):
+    """ Return the dense representation (see :func:`_dense`) of the sum of the
+    *m* highest (or lowest, if not *highest*) of *n* independent copies of
+    *drv*.
+
+    This is a dynamic programming over the values of *drv*, from the best
+    (for keeping) to the worst, whose state is the number of dice showing the
+    values processed so far, and the sum of the kept ones. """
+    xs = np.asarray(drv.xs, dtype=int)
+    ps = np.asarray(drv.ps, dtype=float)
+    order = np.argsort(xs)
+    if highest:
+        order = order[::-1]
+    low = xs.min()
+    m = min(m, n)
+
+    binom = np.zeros((n + 1, n + 1))
+    for i in xrange(n + 1):
+        binom[i, 0] = 1
+        binom[i, 1:i + 1] = binom[i - 1, 0:i] + binom[i - 1, 1:i + 1]
+
+    ## dp[j, s]: j dice show the processed values, and the kept ones sum to
+    ## (their shifted values) s
+    size = m * (xs.max() - low) + 1
+    dp = np.zeros((n + 1, size))
+    dp[0, 0] = 1.0
+    for x, p in zip(xs[order], ps[order]):
+        w = x - low
+        new = np.zeros_like(dp)
+        powers = p ** np.arange(n + 1)
+        for j in np.flatnonzero(dp.any(axis=1)):
+            for c in xrange(n - j + 1):
+                shift = w * min(c, max(m - j, 0))
+                coef = binom[n - j, c] * powers[c]
+                new[j + c, shift:] += coef * dp[j, :size - shift]
+        dp = new
+
+    return m * low, dp[n]
+
+
+def _dense_powers(drv, n):
+    """ Return a list of the dense representations (see :func:`_dense`) of the
+    sums of 0, 1, ..., *n* independent copies of *drv*. The powers are cached
+    on *drv*, so later calls only compute the missing ones, as long as they
+    have at most ``max_cached_powers`` probabilities in total. """
+    powers = drv.__dict__.get('_dense_powers', [(0, np.ones(1))])
+    if len(powers) <= n:
+        powers = list(powers)
+        base_offset, base = _dense(drv)
+        offset, arr = powers[-1]
+        for _ in xrange(len(powers), n + 1):
+            offset, arr = offset + base_offset, _convolve(arr, base)
+            powers.append((offset, arr))
+        if sum(len(arr) for _, arr in powers) <= max_cached_powers:
+            drv.__dict__['_dense_powers'] = powers
+    return powers[:n + 1]
+
+
+def _dense_power(drv, n):
+    """ Return the dense representation of the sum of *n* independent copies
+    of *drv*, by repeated squaring; unlike :func:`_dense_powers`, nothing is
+    cached, so the memory used is that of the result. """
+    offset, arr = 0, np.ones(1)
+    base_offset, base = _dense(drv)
+    while n:
+        if n & 1:
+            offset, arr = offset + base_offset, _convolve(arr, base)
+        n >>= 1
+        if n:
+            base_offset, base = 2 * base_offset, _convolve(base, base)
+    return offset, arr
+
+
+####################################
+## ----- Optional Machinery ----- ##
+####################################
+
+## Instrumentation, the persistent cache and approximate random variables are
+## active only once their modules are imported, so operators look these
+## modules up rather than import them
+
+def _loaded(name):
+    """ Return the module *name* if it was imported, or else None. """
+    return sys.modules.get(name)
+
+
+class _NullSpan(object):
+    """ The span of an invocation which is not recorded. """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def done(self, res):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _span(operator, pool):
+    """ Return :func:`drv.instrument.span` of *operator* on *pool*, or a span
+    which is not recorded if :mod:`drv.instrument` was not imported. """
+    instrument = _loaded('drv.instrument')
+    if instrument is None:
+        return _NULL_SPAN
+    return instrument.span(operator, pool)
+
+
+def _note(kernel=None, tuples=None):
+    """ Note the *kernel* of the innermost invocation, and count *tuples*
+    enumerated tuples, if :mod:`drv.instrument` was imported. """
+    instrument = _loaded('drv.instrument')
+    if instrument is None:
+        return
+    if kernel:
+        instrument.note(kernel=kernel)
+    if tuples:
+        instrument.count(tuples)
+
+
 ##################################
 ## ----- Operator Classes ----- ##
 ##################################
 
+def _to_int(val):
+    """ Return *val* (or each of its components, if it is a tuple) as an
+    integer, making sure it is not changed. """
+    if isinstance(val, tuple):
+        return tuple(_to_int(v) for v in val)
+    ival = int(val)
+    if ival != val:
+        raise ValueError("Output is not an integer.")
+    return ival
+
+
 class Operator(object):
     """ An :class:`Operator` is a class which acts efficiently on a pool of
-    random variables, returning a random variable. """
-    def __init__(self, operator, unpack=False):
+    random variables, returning a random variable. If *joint*, the operator
+    returns tuples of integers, and the result is a joint random variable. """
+    def __init__(self, operator, unpack=False, joint=False):
+        self.function = operator
         if not unpack:
             self.operator = operator
         else:
             self.operator = lambda x: operator(*x)
-
-    def __call__(self, pool, name):
-        return self._operate(pool, name)
+        self.joint = joint
+
+    ## The kind of approximation this operator supports (see
+    ## :mod:`drv.approx`), if any
+    approximation = None
+
+    ## The kind of the operator, which tells the planner which kernels may
+    ## compute it (see :mod:`drv.planner`), if known
+    kind = None
+
+    def __call__(self, pool, name, sampling=None):
+        """ Return the random variable of the operator on *pool*, named
+        *name*. If *sampling* is given (either True or a dictionary of
+        options), it is a Monte Carlo estimate; see :mod:`drv.montecarlo`. """
+        with _span(self, pool) as span:
+            if sampling:
+                import drv.montecarlo
+                res = drv.montecarlo.sample(self, pool, name, sampling)
+            else:
+                res = self._call(pool, name)
+            span.done(res)
+        return res
+
+    def _call(self, pool, name):
+        approx = _loaded('drv.approx')
+        if self.approximation and (max_exact_support is not None or
+                                   approx is not None):
+            import drv.approx
+            res = drv.approx.propagate(self.approximation, pool, name)
+            if res is not None:
+                _note(kernel='approximate')
+                return res
+        if approx is not None and approx.is_approximate(pool):
+            ## Compute exactly on the lattices of approximate random variables
+            pool = approx.discretized(pool)
+
+        if self._direct(pool):
+            res = self._operate(pool, name)
+            ## Results of trivial pools may be their operands themselves
+            if not any(res is rv for rv in pool.drvs):
+                res.plan = Plan('direct', None, None, "at most {} tuples "
+                                "are enumerated".format(max_direct_tuples))
+            return res
+        cache = _loaded('drv.cache')
+        if cache is not None:
+            return cache.call(self, pool, name)
+        import drv.planner
+        return drv.planner.execute(self, pool, name)
+
+    def _direct(self, pool):
+        """ Return whether the result on *pool* is computed directly by
+        :meth:`_operate`; see ``max_direct_tuples``. """
+        if not pool or self.joint:
+            return False
+        if not all(type(rv) is DiscreteRandomVariable for rv in pool.drvs):
+            return False
+        return self._tuples(pool) <= max_direct_tuples
+
+    def _tuples(self, pool):
+        """ Return an estimate of the number of tuples :meth:`_operate`
+        enumerates on *pool*. """
+        return reduce(op.mul, (len(rv.xs) for rv in pool.drvs))
 
     def _operate(self, pool, name, force_int=True):
         """ This method is intended to be overwritten by subclasses, for more
         efficient calculations. If not overwritten, a naive calculation is
         being executed, which may take exponential time. """
         DRV = type(pool.drvs[0])
+        _note(kernel='product',
+              tuples=reduce(op.mul, (len(rv.xs) for rv in pool.drvs)))
 
         d = col.defaultdict(float)
 
@@ -81,10 +387,7 @@ class Operator(object):
             xs, ps = unzip(xp)
             val = self.operator(xs)
             if force_int:
-                ival = int(val)
-                if ival != val:
-                    raise ValueError("Output is not an integer.")
-                val = ival
+                val = _to_int(val)
             d[val] += reduce(op.mul, ps)
 
         formatter = dict(("_{i}".format(i=i), drv) for i, drv in
@@ -93,6 +396,9 @@ class Operator(object):
 
         _xs = d.keys()
         _ps = d.values()
+        if self.joint:
+            import drv.joint
+            return drv.joint.JointDiscreteRandomVariable(_name, xs=_xs, ps=_ps)
         return DRV(_name, xs=_xs, ps=_ps)
 
 
@@ -112,6 +418,18 @@ class ReduceOperator(Operator):
         drvs = self._prepare(pool)
         return self._reduce(drvs, name)
 
+    def _tuples(self, pool):
+        """ Return an estimate of the number of tuples :meth:`_operate`
+        enumerates on *pool*; the partial results are estimated by the sum of
+        the support sizes so far (or by the number of tuples, if it is
+        smaller). """
+        res, tuples, values = 0, 1, 0
+        for rv in pool.drvs:
+            res += (min(tuples, values) if values else 1) * len(rv.xs)
+            tuples *= len(rv.xs)
+            values += len(rv.xs)
+        return res
+
     def _prepare(self, pool):
         return pool.drvs
 
@@ -121,13 +439,16 @@ class ReduceOperator(Operator):
     force_int = True
 
     def _reduce(self, drvs, name):
+        _note(kernel='reduce')
         ## This is the naive implementation, but binary implementation won't be
         ## too difficult, and may be more efficient
         res = drvs[0]
         for rv in drvs[1:]:
             _pool = RandomVariablePool(res, rv)
-            res = super(ReduceOperator, self)._operate(
-                _pool, name, force_int=self.force_int)
+            with _span(self, _pool) as span:
+                res = super(ReduceOperator, self)._operate(
+                    _pool, name, force_int=self.force_int)
+                span.done(res)
 
         return self._pack(res, name)
 
@@ -141,6 +462,20 @@ class MemoryReduceOperator(ReduceOperator):
         self.cast = cast
         self.uncast = uncast
 
+    def _tuples(self, pool):
+        """ Return an estimate of the number of tuples :meth:`_operate`
+        enumerates on *pool*; the partial results are estimated by the number
+        of ``keep``-tuples of the distinct values seen so far (or by the
+        number of tuples, if it is smaller). """
+        keep = getattr(self, 'keep', 1)
+        res, tuples, values = 0, 1, set()
+        for rv in pool.drvs:
+            states = min(tuples, len(values) ** keep) if values else 1
+            res += states * len(rv.xs)
+            tuples *= len(rv.xs)
+            values.update(rv.xs)
+        return res
+
     def _prepare(self, pool):
         drvs = []
         for drv in pool.drvs:
@@ -178,15 +513,27 @@ class IndexedOperator(Operator):
 
 ## Simple arithmetic
 sum_op = ReduceOperator(sum, 0)
-neg_op = IndexedOperator(op.neg, [0])
+neg_op = IndexedOperator(op.neg, [0], unpack=True)
 sub_op = IndexedOperator(op.sub, [0, 1], unpack=True)
 mul_op = ReduceOperator(np.prod, 1)
 pow_op = IndexedOperator(np.power, [0, 1], unpack=True)
 
+sum_op.approximation = 'sum'
+neg_op.approximation = 'neg'
+sub_op.approximation = 'sub'
+mul_op.approximation = 'mul'
+
+sum_op.kind = 'sum'
+sub_op.kind = 'sub'
+mul_op.kind = 'mul'
+
 ## Max/Min
 max_op = ReduceOperator(max)
 min_op = ReduceOperator(min)
 
+max_op.kind = 'max'
+min_op.kind = 'min'
+
 ## Comparison
 ge_op = IndexedOperator(op.ge, [0, 1], unpack=True)
 gt_op = IndexedOperator(op.gt, [0, 1], unpack=True)
@@ -219,6 +566,8 @@ def nth_highest(n):
     """ Return an operator which returns the n'th highest result. """
     mro = MemoryReduceOperator(cast=_tuple(n), uncast=min,
                                operator=_get_n_highest(n), unpack=True)
+    mro.kind = 'nth_highest'
+    mro.keep = n
     return mro
 
 
@@ -227,6 +576,8 @@ def keep_and_sum(n):
     """
     mro = MemoryReduceOperator(cast=_tuple(n), uncast=sum,
                                operator=_get_n_highest(n), unpack=True)
+    mro.kind = 'keep_sum'
+    mro.keep = n
     return mro
 
 
@@ -381,6 +732,14 @@ class BaseDiscreteRandomVariable(object):
         as a function of the random variable's range. """
         raise NotImplementedError
 
+    ## ----- Conditioning ----- ##
+
+    def given(self, event, name=None):
+        """ Return a new discrete random variable, which is the random variable
+        conditioned on *event*; *event* is a boolean function of the value of
+        the random variable. """
+        raise NotImplementedError
+
     ## ----- Arithmetic ----- ##
 
     def unop(self, operator, name):
@@ -434,78 +793,112 @@ class BaseDiscreteRandomVariable(object):
 class DiscreteRandomVariable(BaseDiscreteRandomVariable):
     """ A ``DiscreteRandomVariable`` is a wrapper for a integer-valued discrete
     random variable. """
-    def __init__(self, name, rv=None, xs=None, ps=None):
+    def __init__(self, name, rv=None, xs=None, ps=None, presorted=False):
         """ A ``DiscreteRandomVariable`` may be initialized either with a SciPy
-        random variable *rv*, or with a list of values *xs* with matching
-        probabilities *ps*. """
+        random variable *rv*, or with a sequence (or an array) of values *xs*
+        with matching probabilities *ps*. If *presorted*, *xs* are known to be
+        sorted and distinct, and *ps* to be positive and normalized, so they
+        are used without validation. """
         if rv:
             self._initialize_with_rv(name, rv)
             return
 
-        self._initialize_with_xp(name, xs, ps)
+        self._initialize_with_xp(name, xs, ps, presorted=presorted)
 
     def _initialize_with_rv(self, name, rv):
         """ Initialize the DRV with a SciPy random variable *rv*. It is assumed
-        that *rv* is discrete and integer-valued. """
-        dist = rv.dist
-
-        ## Uniform distribution
-        if type(dist) is ss.distributions.randint_gen:
-            xs = range(rv.args[0], rv.args[1])
-            ps = [rv.pmf(x) for x in xs]
-            self._initialize_with_xp(name, xs, ps)
-            return
+        that *rv* is discrete, integer-valued and finite; for infinite random
+        variables, see :mod:`drv.dists`. """
+        ## SciPy's convention is that the PPF of 0 is one less than the minimum
+        low, high = rv.ppf(0) + 1, rv.ppf(1)
+        if not np.isfinite([low, high]).all():
+            raise ValueError("Infinite support for {rv}.".format(rv=rv))
+
+        xs = np.arange(low, high + 1, dtype=int)
+        ps = rv.pmf(xs)
+        self._initialize_with_xp(name, xs, ps)
 
-        ## Binomial distribution
-        if type(dist) is ss.distributions.binom_gen:
-            xs = range(rv.args[0] + 1)
-            ps = [rv.pmf(x) for x in xs]
-            self._initialize_with_xp(name, xs, ps)
+    def _initialize_with_xp(self, name, xs, ps, presorted=False):
+        """ Initialize the DRV with explicit values and probabilities. Arrays
+        are copied only when they have to be changed. """
+        xs = np.asarray(xs)
+        ps = np.asarray(ps, dtype=float)
+        if presorted:
+            self._initialize_with_arrays(name, xs, ps)
             return
 
-        raise ValueError("Unknown distribution for {rv}.".format(rv=rv))
+        if xs.ndim != 1 or xs.shape != ps.shape:
+            raise ValueError("Values and probabilities should be sequences "
+                             "of the same length.")
 
-    def _initialize_with_xp(self, name, xs, ps):
-        """ Initialize the DRV with explicit values and probabilities. """
-        ## Remove any zero-probability values
-        nz_xs, nz_ps = unzip((x, p) for x, p in zip(xs, ps) if ps > 0)
+        ## Remove any zero-probability values; negative and NaN probabilities
+        ## (which fail any comparison) are errors
+        if len(ps) and not ps.min() >= 0:
+            raise ValueError("Probabilities should be non-negative numbers.")
+        nz = ps != 0
+        if not nz.all():
+            xs, ps = xs[nz], ps[nz]
+        if not len(xs):
+            raise ValueError("No value has a positive probability.")
 
         ## Aggregate equal values
-        d = col.defaultdict(float)
-        for x, p in zip(nz_xs, nz_ps):
-            d[x] += p
-        ag_xs, ag_ps = unzip(d.iteritems())
+        if not (xs[1:] > xs[:-1]).all():
+            xs, inverse = np.unique(xs, return_inverse=True)
+            ps = np.bincount(inverse, weights=ps)
 
         ## Normalize the probabilities, in case we have some error here
-        ar_ps = np.array(ag_ps, dtype=float)
-        n_ps = ar_ps / ar_ps.sum()
+        total = ps.sum()
+        if total != 1:
+            ps = ps / total
+
+        self._initialize_with_arrays(name, xs, ps)
+
+    def _initialize_with_arrays(self, name, xs, ps):
+        """ Initialize the DRV with sorted distinct values *xs* and their
+        (normalized) probabilities *ps*, which are used as they are -- they may
+        be views of memory-mapped or shared memory. """
+        self._name = name
+        self._xs = xs
+        self._ps = ps
+        self._scipy_rv = None
+        self._tails = None
 
-        self._rv = ss.rv_discrete(name=name, values=(ag_xs, n_ps))
+    @property
+    def _rv(self):
+        """ The SciPy random variable, which is created only when needed, as
+        creating it copies (and sorts) the arrays. """
+        if self._scipy_rv is None:
+            import scipy.stats as ss
+            self._scipy_rv = ss.rv_discrete(name=self._name,
+                                            values=(self._xs, self._ps))
+        return self._scipy_rv
 
     @property
     def name(self):
         """ The name of the random variable. """
-        return self._rv.name
+        return self._name
 
     @name.setter
     def name(self, new_name):
         """ Set a new name. """
-        self._rv.name = new_name
+        self._name = new_name
+        if self._scipy_rv is not None:
+            self._scipy_rv.name = new_name
 
     @property
     def xs(self):
         """ The values (support) of the random variable. """
-        return self._rv.xk
+        return self._xs
 
     @property
     def ps(self):
         """ The probabilities of the random variable. """
-        return self._rv.pk
+        return self._ps
 
     @property
     def values(self):
         """ The (value, probability) pairs of the random variable. """
-        return zip(self._rv.xk, self._rv.pk)
+        return zip(self._xs, self._ps)
 
     @property
     def range(self):
@@ -513,12 +906,34 @@ class DiscreteRandomVariable(BaseDiscreteRandomVariable):
         possible values, inclusive. """
         return range(self.min, self.max + 1)
 
+    ## ----- Pickling ----- ##
+
+    def __getstate__(self):
+        """ Only the name and the arrays are pickled; the SciPy random
+        variable, the survival tails and cached convolution powers are
+        recreated when needed. """
+        state = self.__dict__.copy()
+        state['_scipy_rv'] = None
+        state['_tails'] = None
+        state.pop('_dense_powers', None)
+        return state
+
     ## ----- Roll Methods ----- ##
 
     def _roll(self):
         """ Return a result of a single roll. """
         return self._rv.rvs()
 
+    def roll(self, n=None):
+        """ Roll *n* times, if *n* is given, or else a single time; return the
+        results as a list, if *n* is given, or as a single value otherwise.
+        Many rolls are drawn at once, without SciPy (see
+        :mod:`drv.montecarlo`). """
+        if n is None:
+            return self._roll()
+        import drv.montecarlo
+        return drv.montecarlo._sampler(self)(n).tolist()
+
     ## ----- Probability Methods ----- ##
 
     def cdf(self, k):
@@ -551,8 +966,12 @@ class DiscreteRandomVariable(BaseDiscreteRandomVariable):
         return self.expectation(event)
 
     def sf(self, k):
-        """ Return the survival function at *k*. """
-        return self._rv.sf(k)
+        """ Return the survival function at *k*; it is summed from the upper
+        tail (rather than computed as one minus the CDF), so small tail
+        probabilities are not lost. """
+        if self._tails is None:
+            self._tails = np.append(np.cumsum(self._ps[::-1])[::-1], 0.0)
+        return self._tails[np.searchsorted(self._xs, k, side='right')]
 
     ## ----- Probability Inverse Methods ----- ##
 
@@ -588,7 +1007,7 @@ class DiscreteRandomVariable(BaseDiscreteRandomVariable):
     @property
     def max(self):
         """ The maximum value of the random variable. """
-        return max(self._rv.xk)
+        return self._xs[-1]
 
     @property
     def mean(self):
@@ -605,7 +1024,7 @@ class DiscreteRandomVariable(BaseDiscreteRandomVariable):
     @property
     def min(self):
         """ The minimum value of the random variable. """
-        return min(self._rv.xk)
+        return self._xs[0]
 
     @property
     def std(self):
@@ -622,10 +1041,42 @@ class DiscreteRandomVariable(BaseDiscreteRandomVariable):
     def graph(self, method):
         """ Return a graph (that is, a pair of x's and y's) of a given method
         as a function of the random variable's range. """
-        x = self.range
-        y = [method(a) for a in x]
+        x = np.arange(self.min, self.max + 1)
+        try:
+            y = np.asarray(method(x), dtype=float)
+        except (TypeError, ValueError):
+            y = None
+        if y is None or y.shape != x.shape:
+            y = np.array([method(a) for a in x], dtype=float)
         return x, y
 
+    ## ----- Conditioning ----- ##
+
+    def _event_mask(self, event):
+        """ Return a boolean array which marks the values in which *event*
+        holds. *event* is first applied to the whole array of values, and only
+        if it cannot handle arrays, to each value separately. """
+        xs = self.xs
+        try:
+            mask = np.asarray(event(xs), dtype=bool)
+        except (TypeError, ValueError):
+            mask = None
+        if mask is None or mask.shape != xs.shape:
+            mask = np.array([bool(event(x)) for x in xs])
+        return mask
+
+    def given(self, event, name=None):
+        """ Return a new discrete random variable, which is the random variable
+        conditioned on *event*; *event* is a boolean function of the value of
+        the random variable. """
+        mask = self._event_mask(event)
+        if not self.ps[mask].sum() > 0:
+            raise ValueError("The event has zero probability.")
+
+        _name = name or "({name})|event"
+        return DiscreteRandomVariable(_name.format(name=self.name),
+                                      xs=self.xs[mask], ps=self.ps[mask])
+
     ## ----- Arithmetic ----- ##
 
     def unop(self, operator, name):
@@ -677,33 +1128,36 @@ class RandomVariablePool(object):
             pool_ps.append(drv.ps.reshape(shape))
         return pool_ps
 
-    def max(self, name):
+    def max(self, name, sampling=None):
         """ Return the random variable of the maximum of the outcomes. """
-        return max_op(self, name)
+        return max_op(self, name, sampling=sampling)
 
     def median(self, name):
         """ Return the median of the outcomes; this works only if the number of
         rolls is even. """
         raise NotImplementedError
 
-    def nlargest(self, n, name):
+    def nlargest(self, n, name, sampling=None):
         """ Return the random variable of *n*'th largest outcome.
         """
-        return nth_highest(n)(self, name)
+        return nth_highest(n)(self, name, sampling=sampling)
 
-    def nlargest_sum(self, n, name):
+    def nlargest_sum(self, n, name, sampling=None):
         """ Return the random variable of the sum of the *n* largest outcomes.
         """
-        return keep_and_sum(n)(self, name)
+        return keep_and_sum(n)(self, name, sampling=sampling)
 
     def nsmallest(self, name, n):
         """ Return the random variable of the sum of the *n* smallest outcomes.
         """
         raise NotImplementedError
 
-    def sum(self, name):
+    def sum(self, name, sampling=None):
         """ Return the random variable of the sum of the pool. """
-        return sum_op(self, name)
+        return sum_op(self, name, sampling=sampling)
+
+    ## Any of these methods returns a Monte Carlo estimate if *sampling* is
+    ## given; see :mod:`drv.montecarlo`.
 
 
 ##################################
@@ -714,3 +1168,52 @@ def constant(n):
     """ Return the constant random variable *n*. """
     return DiscreteRandomVariable(name=str(n), xs=[n], ps=[1.0])
 
+
+def compound(count, item, name=None):
+    """ Return the random variable of the sum of *count* independent rolls of
+    *item*, where *count* is itself a random variable (with non-negative
+    integer values); for example, the total damage of a random number of hits.
+
+    The result is the mixture of the convolution powers of *item*, weighted by
+    the probabilities of *count*; the powers are cached on *item*.
+    """
+    ns = np.asarray(count.xs, dtype=int)
+    if (ns < 0).any():
+        raise ValueError("The count should be non-negative.")
+    powers = _dense_powers(item, ns.max())
+
+    offsets = [powers[n][0] for n in ns]
+    ends = [powers[n][0] + len(powers[n][1]) for n in ns]
+    low = min(offsets)
+    res = np.zeros(max(ends) - low)
+    for n, p in zip(ns, count.ps):
+        offset, arr = powers[n]
+        res[offset - low:offset - low + len(arr)] += p * arr
+
+    _name = name or "({count.name})d({item.name})"
+    return DiscreteRandomVariable(_name.format(count=count, item=item),
+                                  xs=np.arange(len(res)) + low, ps=res)
+
+
+def mixture(components, name=None):
+    """ Return the random variable which is a mixture of the given random
+    variables; *components* is a sequence of (probability, random variable)
+    pairs, whose probabilities sum to 1. For example, a damage roll which
+    happens only if an attack succeeds is::
+
+        mixture([(p, damage), (1 - p, constant(0))])
+
+    All the components are accumulated together over their concatenated
+    supports. """
+    weights, drvs = unzip(components)
+    weights = np.array(weights, dtype=float)
+    if (weights < 0).any() or not np.isclose(weights.sum(), 1.0):
+        raise ValueError("Mixture weights should be a probability vector.")
+
+    xs = np.concatenate([drv.xs for drv in drvs])
+    ps = np.concatenate([w * drv.ps for w, drv in zip(weights, drvs)])
+
+    _name = name or "mix({})".format(", ".join(
+        "{w:g}:{drv.name}".format(w=w, drv=drv)
+        for w, drv in zip(weights, drvs)))
+    return DiscreteRandomVariable(_name, xs=xs, ps=ps)
@@ -4,6 +4,13 @@ dice package.
 
 from drv.dice.base import dk, ndk
 
+import drv.lazy
 
-for k in [1, 2, 3, 4, 5, 6, 8, 10, 12, 20, 100]:
-    locals()['d{}'.format(k)] = dk(k)
+## Python basics
+import functools as fn
+
+
+## The common dice are built lazily, on first access
+drv.lazy.attributes(__name__, dict(
+    ('d{}'.format(k), fn.partial(dk, k))
+    for k in [1, 2, 3, 4, 5, 6, 8, 10, 12, 20, 100]))
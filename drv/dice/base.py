@@ -6,7 +6,10 @@ Base game mechanics.
 
 ## Framework
 import drv.core
-import scipy.stats as ss
+import drv.lazy
+
+## Math
+import numpy as np
 
 ## Sugar
 DRV = drv.core.DiscreteRandomVariable
@@ -18,7 +21,8 @@ def dk(k, name=None):
     """
     _name = name or "1d{k}"
     name = _name.format(k=k)
-    return DRV(name, rv=ss.randint(1, k + 1))
+    return drv.core._from_arrays(name, np.arange(1, k + 1),
+                                 np.repeat(1. / k, k))
 
 
 def ndk(n, k, name=None):
@@ -32,11 +36,6 @@ def ndk(n, k, name=None):
     return POOL(*(die for _ in xrange(n))).sum(name=name)
 
 
-## Percentile dice
-dp = dk(100)
-dp.name = 'd%'
-
-
 def custom_die(values, name):
     """ Return the random variable representing rolling a single custom die,
     whose values are *values*.  """
@@ -46,3 +45,85 @@ def custom_die(values, name):
     ps = [1./n] * n
     return DRV(_name, xs=xs, ps=ps)
 
+
+## Open-ended dice; their infinite tails are truncated at mass *tol*
+
+def _n_terms(p, tol):
+    """ Return the number of terms of a geometric series with ratio *p* after
+    which the remaining tail is at most *tol*. """
+    if p <= 0:
+        return 1
+    return int(np.ceil(np.log(tol) / np.log(p))) + 1
+
+
+def compounding_dk(k, explode=None, tol=1e-12, name=None):
+    """ Return the random variable representing rolling a single *k*-sided
+    die, which is rolled again and added whenever the result is at least
+    *explode* (by default, only on *k*); this is sometimes called an "ace" or
+    a "wild die". """
+    explode = k if explode is None else explode
+    if not 1 < explode <= k:
+        raise ValueError("Should explode on some, but not all, faces.")
+
+    ## The sum of the exploding rolls, followed by a single stopping roll
+    stop = np.repeat(1. / k, explode - 1)
+    again = np.repeat(1. / k, k - explode + 1)
+    n = _n_terms((k - explode + 1.) / k, tol)
+    res = np.zeros(n * k + 1)
+    chain, offset = np.ones(1), 0
+    for _ in xrange(n):
+        term = np.convolve(chain, stop)
+        res[offset + 1:offset + 1 + len(term)] += term
+        chain, offset = np.convolve(chain, again), offset + explode
+
+    _name = name or "1d{k}!!"
+    return DRV(_name.format(k=k), xs=np.arange(len(res)), ps=res)
+
+
+def exploding_dk(k, target, explode=None, tol=1e-12, name=None):
+    """ Return the random variable representing the number of successes (that
+    is, results of at least *target*) of rolling a single *k*-sided die, where
+    each result of at least *explode* (by default, only *k*) grants an extra
+    die, which is counted separately. """
+    explode = k if explode is None else explode
+    if not 1 < explode <= k:
+        raise ValueError("Should explode on some, but not all, faces.")
+
+    def _faces(low, high):
+        return max(0, min(high, k) - max(low, 1) + 1) / float(k)
+
+    ## Per roll: (explode, success), (explode, failure), (stop, success),
+    ## (stop, failure); the number of successes has the generating function
+    ## (c x + d) / (1 - b - a x), which is a (shifted) geometric series
+    a = _faces(max(explode, target), k)
+    b = _faces(explode, min(target - 1, k))
+    c = _faces(target, explode - 1)
+    d = _faces(1, min(target, explode) - 1)
+    r = a / (1 - b)
+    n = _n_terms(r, tol)
+    gs = r ** np.arange(n) / (1 - b)
+    ps = d * np.append(gs, 0) + c * np.append(0, gs)
+
+    _name = name or "1d{k}!>={target}"
+    return DRV(_name.format(k=k, target=target), xs=np.arange(n + 1), ps=ps)
+
+
+def reroll_dk(k, below, once=True, name=None):
+    """ Return the random variable representing rolling a single *k*-sided
+    die, and rerolling results below *below*; if *once*, the reroll is kept
+    whatever its result is. """
+    if not 1 <= below <= k:
+        raise ValueError("Reroll threshold should be between 1 and k.")
+
+    xs = np.arange(1, k + 1)
+    if once:
+        ps = (xs >= below) / float(k) + (below - 1.) / k ** 2
+    else:
+        ps = (xs >= below) / float(k - below + 1)
+
+    _name = name or ("1d{k}ro<{below}" if once else "1d{k}r<{below}")
+    return DRV(_name.format(k=k, below=below), xs=xs, ps=ps)
+
+
+## Percentile dice
+drv.lazy.attributes(__name__, {'dp': lambda: dk(100, name='d%')})
@@ -10,6 +10,9 @@ Rules can be found here:
 import drv.core
 import drv.dice.base
 
+## Math
+import numpy as np
+
 ## Sugar
 POOL = drv.core.RandomVariablePool
 dk = drv.dice.base.dk
@@ -44,5 +47,145 @@ def attack(attacker, defender):
     return atk
 
 
-## Todo: a whole battle, perhaps?
+## A whole battle is an absorbing Markov chain over the remaining armies
+
+@drv.core.memoize
+def _attack_losses(attacker, defender):
+    """ Return the arrays of the attacker's losses, the defender's losses and
+    their probabilities, of a single attack in which the attacker has
+    *attacker* rolls and the defender has *defender* rolls. """
+    atk = attack(attacker, defender)
+    compared = min(attacker, defender)
+    xs = atk.xs.astype(int)
+    return (compared - xs) // 2, (compared + xs) // 2, atk.ps
+
+
+class _BattleSolver(object):
+    """ An absorbing Markov chain whose transient states are the pairs (a, d)
+    of remaining armies, for 1 <= a <= *max_a* and 1 <= d <= *max_d*. The
+    absorbing states are (a, 0), in which the attacker wins with *a* armies,
+    and (0, d), in which the defender wins with *d* armies.
+
+    The sparse transition matrix is built once, and the sparse LU factors of
+    the system are kept, so any batch of starting positions within the bounds
+    is solved by a pair of triangular solves with these factors. """
+    def __init__(self, max_a, max_d):
+        import scipy.sparse as sp
+        import scipy.sparse.linalg as spl
+        self.max_a = max_a
+        self.max_d = max_d
+
+        a, d = np.mgrid[1:max_a + 1, 1:max_d + 1]
+        a, d = a.ravel(), d.ravel()
+        n = len(a)
+
+        q_rows, q_cols, q_ps = [], [], []
+        r_rows, r_cols, r_ps = [], [], []
+        for na in (1, 2, 3):
+            for nd in (1, 2):
+                ## The states in which these are the numbers of rolls
+                sel = np.flatnonzero((np.minimum(a, 3) == na) &
+                                     (np.minimum(d, 2) == nd))
+                if not len(sel):
+                    continue
+                a_loss, d_loss, ps = _attack_losses(na, nd)
+                for al, dl, p in zip(a_loss, d_loss, ps):
+                    to_a, to_d = a[sel] - al, d[sel] - dl
+                    trans = (to_a > 0) & (to_d > 0)
+                    q_rows.append(sel[trans])
+                    q_cols.append(self.index(to_a[trans], to_d[trans]))
+                    q_ps.append(np.repeat(p, trans.sum()))
+                    absb = ~trans
+                    r_rows.append(sel[absb])
+                    r_cols.append(self.absorbing_index(to_a[absb],
+                                                       to_d[absb]))
+                    r_ps.append(np.repeat(p, absb.sum()))
+
+        q = sp.coo_matrix((np.concatenate(q_ps), (np.concatenate(q_rows),
+                                                  np.concatenate(q_cols))),
+                          shape=(n, n))
+        self.r = sp.coo_matrix((np.concatenate(r_ps),
+                                (np.concatenate(r_rows),
+                                 np.concatenate(r_cols))),
+                               shape=(n, max_a + max_d)).tocsr()
+
+        ## Absorption probabilities are B = (I - Q)^-1 R; to get only the rows
+        ## of the starting positions we solve the transposed system
+        self._lu = spl.splu((sp.identity(n, format='csc') - q).T.tocsc())
+
+    def covers(self, attackers, defenders):
+        """ Return whether the starting position is within the bounds. """
+        return attackers <= self.max_a and defenders <= self.max_d
+
+    def index(self, a, d):
+        """ Return the index of the transient state (a, d). """
+        return (a - 1) * self.max_d + (d - 1)
+
+    def absorbing_index(self, a, d):
+        """ Return the index of the absorbing state (a, 0) or (0, d). """
+        return np.where(d == 0, a - 1, self.max_a + d - 1)
+
+    def solve(self, positions):
+        """ Return an array whose rows are the absorption probabilities of the
+        starting *positions*, which is a sequence of (a, d) pairs. """
+        a, d = np.array(positions, dtype=int).reshape(-1, 2).T
+        rhs = np.zeros((self.max_a * self.max_d, len(a)))
+        rhs[self.index(a, d), np.arange(len(a))] = 1.0
+        return self.r.T.dot(self._lu.solve(rhs)).T
+
+    def outcomes(self):
+        """ Return the outcome of each absorbing state; a positive value is
+        the number of the attacker's surviving armies, and a negative value is
+        minus the number of the defender's surviving armies. """
+        return np.concatenate((np.arange(1, self.max_a + 1),
+                               -np.arange(1, self.max_d + 1)))
+
+
+_solvers = []
+
+
+def _battle_solver(max_a, max_d):
+    """ Return a (cached) solver which covers the given bounds. """
+    for solver in _solvers:
+        if solver.covers(max_a, max_d):
+            return solver
+    solver = _BattleSolver(max_a, max_d)
+    _solvers.append(solver)
+    return solver
+
+
+def battles(positions):
+    """ Return a list of battle random variables, one for each (attackers,
+    defenders) pair in *positions*; see :func:`battle`. All positions are
+    solved together. """
+    positions = [(int(a), int(d)) for a, d in positions]
+    for a, d in positions:
+        if a < 1 or d < 1:
+            raise ValueError("Both sides should have at least one army.")
+    if not positions:
+        return []
+
+    solver = _battle_solver(max(a for a, _ in positions),
+                            max(d for _, d in positions))
+    outcomes = solver.outcomes()
+    name = "Risk battle: {} attack {}"
+    res = []
+    for (a, d), ps in zip(positions, solver.solve(positions)):
+        ## Remove the solver's noise around zero
+        res.append(drv.core.DiscreteRandomVariable(name.format(a, d),
+                                                   xs=outcomes,
+                                                   ps=np.maximum(ps, 0)))
+    return res
+
+
+def battle(attackers, defenders):
+    """ Return a random variable of the outcome of a whole battle, in which
+    *attackers* armies attack until either side is eliminated. *attackers*
+    counts only the armies which may attack (that is, without the army which
+    must stay behind), and each attack uses as many dice as allowed.
+
+    A positive result is the number of the attacker's surviving armies, and a
+    negative result is minus the number of the defender's surviving armies.
+    """
+    return battles([(attackers, defenders)])[0]
 
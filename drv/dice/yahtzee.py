@@ -1,7 +1,191 @@
 """
 .. yahtzee.py
+
+A single Yahtzee turn: five dice are rolled, and up to twice any of them are
+kept and the rest rerolled. Here we find, for a target category, the keep
+policy which maximizes the expected score, and the distribution of the score
+under this policy.
+
+The state of the dice is their multiset (there are 252 of them), and a keep is
+a sub-multiset (there are 462 of them, of all sizes); the transition matrix
+from keeps to states is computed once.
 """
 
-## I'm not sure I want to do this, as this is not extremely interesting, but I
-## leave the option...
+## Framework
+import drv.core
+
+## Math
+import numpy as np
+
+## Python basics
+import itertools as it
+import math
+
+
+## Sugar
+DRV = drv.core.DiscreteRandomVariable
+
+N_DICE = 5
+FACES = 6
+N_ROLLS = 3
+
+
+def _multisets(n):
+    """ Return the sorted tuples of *n* dice results. """
+    return list(it.combinations_with_replacement(xrange(1, FACES + 1), n))
+
+
+def _counts(dice):
+    """ Return the counts of each face in *dice*. """
+    counts = [0] * FACES
+    for x in dice:
+        counts[x - 1] += 1
+    return counts
+
+
+def _probability(dice):
+    """ Return the probability of rolling the multiset *dice*. """
+    res = math.factorial(len(dice))
+    for c in _counts(dice):
+        res /= math.factorial(c)
+    return res / float(FACES ** len(dice))
+
+
+@drv.core.memoize
+def _tables():
+    """ Return the states, the keeps, the (keeps x states) transition matrix
+    and the (states x keeps) boolean matrix of allowed keeps. """
+    states = _multisets(N_DICE)
+    keeps = [k for n in xrange(N_DICE + 1) for k in _multisets(n)]
+    state_index = dict((s, i) for i, s in enumerate(states))
+    keep_index = dict((k, i) for i, k in enumerate(keeps))
+
+    transitions = np.zeros((len(keeps), len(states)))
+    for i, keep in enumerate(keeps):
+        for roll in _multisets(N_DICE - len(keep)):
+            state = tuple(sorted(keep + roll))
+            transitions[i, state_index[state]] += _probability(roll)
+
+    allowed = np.zeros((len(states), len(keeps)), dtype=bool)
+    for i, state in enumerate(states):
+        for n in xrange(N_DICE + 1):
+            for keep in it.combinations(state, n):
+                allowed[i, keep_index[keep]] = True
+
+    return states, keeps, transitions, allowed
+
+
+############################
+## ----- Categories ----- ##
+############################
+
+def _has_run(counts, n):
+    """ Return a boolean array which marks the rows of *counts* which contain
+    a run of *n* consecutive faces. """
+    present = counts > 0
+    runs = [present[:, i:i + n].all(axis=1) for i in xrange(FACES - n + 1)]
+    return np.any(runs, axis=0)
+
+
+def _score_upper(face):
+    return lambda dice, counts: face * counts[:, face - 1]
+
+
+def _score_of_a_kind(n):
+    return lambda dice, counts: (counts.max(axis=1) >= n) * dice.sum(axis=1)
+
+
+def _score_full_house(dice, counts):
+    srt = np.sort(counts, axis=1)
+    return 25 * ((srt[:, -1] == 3) & (srt[:, -2] == 2))
+
+
+def _score_small_straight(dice, counts):
+    return 30 * _has_run(counts, 4)
+
+
+def _score_large_straight(dice, counts):
+    return 40 * _has_run(counts, 5)
+
+
+def _score_yahtzee(dice, counts):
+    return 50 * (counts.max(axis=1) == N_DICE)
+
+
+def _score_chance(dice, counts):
+    return dice.sum(axis=1)
+
+
+categories = {
+    'ones': _score_upper(1),
+    'twos': _score_upper(2),
+    'threes': _score_upper(3),
+    'fours': _score_upper(4),
+    'fives': _score_upper(5),
+    'sixes': _score_upper(6),
+    'three_of_a_kind': _score_of_a_kind(3),
+    'four_of_a_kind': _score_of_a_kind(4),
+    'full_house': _score_full_house,
+    'small_straight': _score_small_straight,
+    'large_straight': _score_large_straight,
+    'yahtzee': _score_yahtzee,
+    'chance': _score_chance,
+}
+
+
+def scores(category):
+    """ Return the array of the scores of all states in *category*. """
+    if category not in categories:
+        raise ValueError("Unknown category {}.".format(category))
+    states = _tables()[0]
+    dice = np.array(states)
+    counts = np.array([_counts(s) for s in states])
+    return categories[category](dice, counts).astype(int)
+
+
+##########################
+## ----- Strategy ----- ##
+##########################
+
+@drv.core.memoize
+def _solve(category):
+    """ Return the optimal policies (keep indices per state, one array per
+    reroll) and the final distribution over the states. """
+    states, keeps, transitions, allowed = _tables()
+
+    ## Backward: the expected score of each state before each reroll
+    policies = []
+    values = scores(category).astype(float)
+    for _ in xrange(N_ROLLS - 1):
+        keep_values = transitions.dot(values)
+        options = np.where(allowed, keep_values, -np.inf)
+        policy = options.argmax(axis=1)
+        policies.insert(0, policy)
+        values = options[np.arange(len(states)), policy]
+
+    ## Forward: the distribution of the states under the policies
+    dist = transitions[keeps.index(())]
+    for policy in policies:
+        dist = dist.dot(transitions[policy])
+
+    return policies, dist
+
+
+def strategy(category):
+    """ Return the optimal policy of *category*, as a list of dictionaries
+    (one per reroll) from the rolled dice to the dice which should be kept.
+    """
+    states, keeps = _tables()[:2]
+    policies = _solve(category)[0]
+    return [dict((s, keeps[k]) for s, k in zip(states, policy))
+            for policy in policies]
+
 
+def turn(category):
+    """ Return the random variable of the score of a single turn, which
+    targets *category* and follows its optimal policy. """
+    dist = _solve(category)[1]
+    xs, inverse = np.unique(scores(category), return_inverse=True)
+    ps = np.bincount(inverse, weights=dist)
+    name = "Yahtzee turn: {}".format(category)
+    return DRV(name, xs=xs, ps=ps)
@@ -2,10 +2,22 @@
 .. dists.py
 
 Standard discrete probability distributions.
+
+Finite distributions are evaluated exactly. Infinite distributions are
+truncated once the remaining tail mass is at most *tol*, and the probabilities
+are then renormalized.
 """
 
 ## Framework
+import drv.core
 import scipy.stats as ss
+import scipy.special as sp
+
+## Math
+import numpy as np
+
+## Sugar
+DRV = drv.core.DiscreteRandomVariable
 
 
 ## The following explains the hierarchy of discrete probability distributions
@@ -23,39 +35,197 @@ import scipy.stats as ss
 ## I am not entirely sure we need the non-negative variation.
 
 ## TODO: add the following distributions
-## - Bernoulli :: FIDRV :: bernoulli
-## - beta-binomial :: FIDRV :: ?
 ## - beta negative binomial :: NIDRV :: ?
-## - binomial :: FIDRV :: binom
 ## - Boltzmann :: ? :: ?
 ##     (also: Gibbs)
 ## - Borel :: NIDRV :: ?
 ## - Conway-Maxwell-Poisson :: NIDRV :: ?
 ##     (also: CMP, COM-Poisson)
-## - degenerate :: FIDRV :: ?
-##     (also: deterministic)
 ## - displaced Poisson :: ? :: ?
 ##     (also: hyper-Poisson)
 ## - extended negative binomial :: ? :: ?
 ## - Fisher's noncentral hypergeometric :: FIDRV :: ?
-## - geometric :: NIDRV :: geom
-## - hypergeometric :: FIDRV :: hypergeom
-## - logarithmic :: NIDRV :: ?
-##     (also: logarithmic series, log-series)
-## - negative binomial :: NIDRV :: nbinom
 ## - parabolic fractal :: ? :: ?
-## - Poisson :: NIDRV :: poisson
-## - Poisson binomial :: FIDRV :: ?
-## - Rademacher :: FIDRV :: ?
-## - Skellam :: IDRV :: ?
-## - uniform :: FIDRV :: randint
 ## - Wallenius' noncentral hypergeometric :: FIDRV :: ?
 ## - Yule-Simon :: NIDRV :: ?
-## - zero-truncated Poisson :: ? :: ?
-##     (also: ZTP)
-## - zeta :: NIDRV :: ?
 
 ## More:
-## - Zipf's
 ## - Benford's
 
+
+## Beyond this support size, refuse to evaluate a heavy tail
+max_support = 10 ** 7
+
+
+#######################
+## ----- Utils ----- ##
+#######################
+
+class _Conditioned(object):
+    """ The pmf and the survival function *pmf* and *sf*, conditioned on an
+    event of probability *p* which contains the support of interest. """
+    def __init__(self, pmf, sf, p):
+        self._pmf, self._sf, self._p = pmf, sf, p
+
+    def pmf(self, xs):
+        return self._pmf(xs) / self._p
+
+    def sf(self, xs):
+        return self._sf(xs) / self._p
+
+
+def _truncated(rv, low, tol, name):
+    """ Return the random variable whose support is *low*, *low* + 1, ...,
+    and whose probabilities are given by *rv* (an object with vectorized
+    ``pmf`` and ``sf``), truncated at the first value whose survival function
+    is at most *tol*. The pmf is evaluated in blocks of doubling sizes, and
+    the survival function only at the end of each block. """
+    xs, ps = [], []
+    start, size = low, 64
+    while True:
+        if start - low > max_support:
+            raise ValueError("The tail is too heavy for tolerance {}.".format(
+                tol))
+        block_xs = np.arange(start, start + size)
+        block_ps = rv.pmf(block_xs)
+        xs.append(block_xs)
+        ps.append(block_ps)
+        last_sf = rv.sf(block_xs[-1])
+        if last_sf <= tol:
+            ## The survival function of every value of the block
+            sfs = last_sf + np.concatenate((block_ps[:0:-1].cumsum()[::-1],
+                                            [0]))
+            end = start - low + np.flatnonzero(sfs <= tol)[0] + 1
+            break
+        start, size = start + size, size * 2
+
+    xs, ps = np.concatenate(xs), np.concatenate(ps)
+    return DRV(name, xs=xs[:end], ps=ps[:end])
+
+
+######################################
+## ----- Finite Distributions ----- ##
+######################################
+
+def degenerate(n, name=None):
+    """ Return the constant random variable *n*. """
+    return DRV(name or str(n), xs=[n], ps=[1.0])
+
+
+def uniform(low, high, name=None):
+    """ Return the uniform random variable on *low*, ..., *high*. """
+    _name = name or "U({low},{high})"
+    return DRV(_name.format(low=low, high=high), rv=ss.randint(low, high + 1))
+
+
+def bernoulli(p, name=None):
+    """ Return the Bernoulli random variable with success probability *p*. """
+    _name = name or "Bernoulli({p})"
+    return DRV(_name.format(p=p), xs=[0, 1], ps=[1 - p, p])
+
+
+def rademacher(name=None):
+    """ Return the random variable which is -1 or 1 with equal probability.
+    """
+    return DRV(name or "Rademacher", xs=[-1, 1], ps=[0.5, 0.5])
+
+
+def binomial(n, p, name=None):
+    """ Return the binomial random variable of *n* trials with success
+    probability *p*. """
+    _name = name or "B({n},{p})"
+    return DRV(_name.format(n=n, p=p), rv=ss.binom(n, p))
+
+
+def hypergeometric(total, good, draws, name=None):
+    """ Return the hypergeometric random variable of the number of good
+    objects in *draws* draws without replacement from *total* objects, of
+    which *good* are good. """
+    _name = name or "Hypergeometric({total},{good},{draws})"
+    _name = _name.format(total=total, good=good, draws=draws)
+    return DRV(_name, rv=ss.hypergeom(total, good, draws))
+
+
+def beta_binomial(n, a, b, name=None):
+    """ Return the beta-binomial random variable of *n* trials, whose success
+    probability is Beta(*a*, *b*) distributed. """
+    xs = np.arange(n + 1)
+    log_ps = (sp.gammaln(n + 1) - sp.gammaln(xs + 1) - sp.gammaln(n - xs + 1) +
+              sp.betaln(xs + a, n - xs + b) - sp.betaln(a, b))
+    _name = name or "BetaBinomial({n},{a},{b})"
+    return DRV(_name.format(n=n, a=a, b=b), xs=xs, ps=np.exp(log_ps))
+
+
+def poisson_binomial(ps, name=None):
+    """ Return the random variable of the number of successes of independent
+    trials, whose success probabilities are *ps*. """
+    res = np.ones(1)
+    for p in ps:
+        res = np.convolve(res, [1 - p, p])
+    _name = name or "PoissonBinomial({n})"
+    return DRV(_name.format(n=len(ps)), xs=np.arange(len(res)), ps=res)
+
+
+def zipf(n, s, name=None):
+    """ Return the random variable of Zipf's law on 1, ..., *n* with exponent
+    *s*. """
+    xs = np.arange(1, n + 1)
+    ps = xs ** -float(s)
+    _name = name or "Zipf({n},{s})"
+    return DRV(_name.format(n=n, s=s), xs=xs, ps=ps / ps.sum())
+
+
+########################################
+## ----- Infinite Distributions ----- ##
+########################################
+
+def geometric(p, tol=1e-12, name=None):
+    """ Return the geometric random variable of the number of trials until
+    the first success, with success probability *p*. """
+    _name = name or "Geometric({p})"
+    return _truncated(ss.geom(p), 1, tol, _name.format(p=p))
+
+
+def poisson(mu, tol=1e-12, name=None):
+    """ Return the Poisson random variable with mean *mu*. """
+    _name = name or "Poisson({mu})"
+    return _truncated(ss.poisson(mu), 0, tol, _name.format(mu=mu))
+
+
+def zero_truncated_poisson(mu, tol=1e-12, name=None):
+    """ Return the Poisson random variable with parameter *mu*, conditioned
+    on being positive. """
+    rv = ss.poisson(mu)
+    ztp = _Conditioned(rv.pmf, rv.sf, rv.sf(0))
+    _name = name or "ZTP({mu})"
+    return _truncated(ztp, 1, tol, _name.format(mu=mu))
+
+
+def negative_binomial(n, p, tol=1e-12, name=None):
+    """ Return the negative binomial random variable of the number of
+    failures before the *n*'th success, with success probability *p*. """
+    _name = name or "NB({n},{p})"
+    return _truncated(ss.nbinom(n, p), 0, tol, _name.format(n=n, p=p))
+
+
+def logarithmic(p, tol=1e-12, name=None):
+    """ Return the logarithmic (log-series) random variable with parameter
+    *p*. """
+    _name = name or "Log({p})"
+    return _truncated(ss.logser(p), 1, tol, _name.format(p=p))
+
+
+def zeta(a, tol=1e-12, name=None):
+    """ Return the zeta random variable with parameter *a* > 1. Its tail is
+    heavy, so small *a* requires a large *tol*. """
+    _name = name or "Zeta({a})"
+    return _truncated(ss.zipf(a), 1, tol, _name.format(a=a))
+
+
+def skellam(mu1, mu2, tol=1e-12, name=None):
+    """ Return the Skellam random variable, which is the difference of two
+    independent Poisson random variables with means *mu1* and *mu2*. """
+    rv = ss.skellam(mu1, mu2)
+    xs = np.arange(rv.ppf(tol / 2), rv.isf(tol / 2) + 1, dtype=int)
+    _name = name or "Skellam({mu1},{mu2})"
+    return DRV(_name.format(mu1=mu1, mu2=mu2), xs=xs, ps=rv.pmf(xs))
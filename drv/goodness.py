@@ -0,0 +1,125 @@
+"""
+.. goodness.py
+
+Streaming goodness-of-fit checks of logs of real rolls against a random
+variable. A :class:`GoodnessOfFit` ingests rolls in chunks (of any size), and
+keeps only the count of every value of the random variable's support, so its
+memory does not depend on the size of the log::
+
+    fit = drv.goodness.GoodnessOfFit(d6)
+    for chunk in pandas.read_csv('rolls.csv', chunksize=10 ** 6):
+        fit.update(chunk['roll'].values)
+    fit.chi_square()
+    fit.estimate().pmf_bounds(6)
+"""
+
+## Framework
+import drv.montecarlo
+
+## Math
+import numpy as np
+
+## Data containers
+import collections as col
+
+
+## The result of a test
+Test = col.namedtuple('Test', ('statistic', 'pvalue'))
+
+
+class GoodnessOfFit(object):
+    """ A ``GoodnessOfFit`` counts rolls which are supposed to be drawn from
+    the random variable *rv*, and tests this hypothesis. Rolls which are not
+    in the support of *rv* are counted as ``outside``. """
+    def __init__(self, rv):
+        self.rv = rv
+        self._xs = np.asarray(rv.xs, dtype=np.int64)
+        self._ps = np.asarray(rv.ps, dtype=float)
+        self._dense = self._xs[-1] - self._xs[0] + 1 == len(self._xs)
+        self.counts = np.zeros(len(self._xs), dtype=np.int64)
+        self.outside = 0
+
+    @property
+    def n(self):
+        """ The number of rolls counted so far. """
+        return int(self.counts.sum()) + self.outside
+
+    def update(self, rolls):
+        """ Count *rolls*, an array or an iterable of rolls; return the
+        ``GoodnessOfFit`` itself. """
+        if not isinstance(rolls, np.ndarray):
+            rolls = np.fromiter(rolls, dtype=np.int64)
+        rolls = np.asarray(rolls, dtype=np.int64).ravel()
+        if self._dense:
+            idx = rolls - self._xs[0]
+            inside = (idx >= 0) & (idx < len(self._xs))
+        else:
+            idx = np.minimum(np.searchsorted(self._xs, rolls),
+                             len(self._xs) - 1)
+            inside = self._xs[idx] == rolls
+        idx = idx[inside]
+        self.counts += np.bincount(idx, minlength=len(self._xs))
+        self.outside += len(rolls) - len(idx)
+        return self
+
+    ## ----- Tests ----- ##
+
+    def _check(self):
+        if not self.n:
+            raise ValueError("No rolls were counted.")
+
+    def chi_square(self):
+        """ Return the :class:`Test` of Pearson's chi-square statistic. """
+        import scipy.special as sp
+        self._check()
+        if self.outside:
+            return Test(np.inf, 0.0)
+        expected = self.n * self._ps
+        statistic = ((self.counts - expected) ** 2 / expected).sum()
+        return Test(statistic, sp.chdtrc(len(self._xs) - 1, statistic))
+
+    def g_test(self):
+        """ Return the :class:`Test` of the G statistic (the log-likelihood
+        ratio). """
+        import scipy.special as sp
+        self._check()
+        if self.outside:
+            return Test(np.inf, 0.0)
+        observed = self.counts > 0
+        counts = self.counts[observed]
+        expected = self.n * self._ps[observed]
+        statistic = 2 * (counts * np.log(counts / expected)).sum()
+        return Test(statistic, sp.chdtrc(len(self._xs) - 1, statistic))
+
+    def ks(self):
+        """ Return the :class:`Test` of the Kolmogorov-Smirnov statistic; its
+        p-value is the asymptotic one, which is conservative for discrete
+        random variables. """
+        import scipy.special as sp
+        self._check()
+        if self.outside:
+            return Test(1.0, 0.0)
+        empirical = np.cumsum(self.counts) / float(self.n)
+        statistic = np.abs(empirical - np.cumsum(self._ps)).max()
+        return Test(statistic, sp.kolmogorov(np.sqrt(self.n) * statistic))
+
+    ## ----- Estimation ----- ##
+
+    def estimate(self, confidence=0.95, method='wilson', name=None):
+        """ Return the estimate of the probabilities of the faces (the values
+        of the support), as a
+        :class:`drv.montecarlo.EstimatedDiscreteRandomVariable`, whose
+        probabilities have confidence intervals of level *confidence*. Rolls
+        outside the support are ignored, so the probabilities are estimated
+        (and sum to 1) over the rolls in the support; check ``outside``, or
+        one of the tests, to see whether the support itself is wrong. """
+        self._check()
+        inside = int(self.counts.sum())
+        if not inside:
+            raise ValueError("No rolls in the support were counted.")
+        if name is None:
+            name = "Estimated {}".format(self.rv.name)
+        rolled = self.counts > 0
+        return drv.montecarlo.EstimatedDiscreteRandomVariable(
+            name, self._xs[rolled], self.counts[rolled], inside,
+            confidence=confidence, method=method)
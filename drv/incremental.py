@@ -0,0 +1,144 @@
+"""
+.. incremental.py
+
+Incremental pools; these are pools of dice which may be changed one die at a
+time, while keeping the distribution of their sum (or of their number of
+successes) up to date.
+
+The dice are the leaves of a balanced product tree, in which every node holds
+the convolution of its children. Adding or removing a die only recomputes the
+nodes on the path from its leaf to the root, so no deconvolution (which is
+numerically unstable) is ever needed.
+
+An update is O(log n) convolutions, but they are not cheap ones: the support of
+a node grows with the number of dice below it, so with *n* dice of *s* sides
+the node at height *h* is about ``2**h * s`` wide, and the convolutions near
+the root are as wide as the whole sum. The convolution at the root dominates:
+an update costs about ``n * s * log(n * s)`` once the nodes are convolved via
+FFT (a rebuild costs about ``log(n)`` times more), but about ``(n * s)**2 / 4``
+while they are convolved directly (below ``drv.core.fft_threshold``), which is
+roughly half a rebuild. A pool which counts successes has nodes of one value
+per die, so the same bounds hold with ``s = 1``.
+"""
+
+## Framework
+import drv.core
+
+## Math
+import numpy as np
+
+## Data containers
+import collections as col
+
+
+## Sugar
+DRV = drv.core.DiscreteRandomVariable
+
+## The dense representation of the constant 0, which is the identity of the
+## convolution
+_IDENTITY = (0, np.ones(1))
+
+
+def _key(rv, target):
+    """ Return a hashable key of a die and its target. """
+    return tuple(rv.xs), tuple(rv.ps), target
+
+
+class IncrementalPool(object):
+    """ An ``IncrementalPool`` is a mutable pool of random variables, whose sum
+    is maintained under the addition and the removal of single random
+    variables. Every update recomputes the nodes above one leaf, whose widths
+    double up to the width of the whole sum (see the module's documentation).
+    """
+    def __init__(self, *drvs):
+        self._capacity = 1
+        self._nodes = [_IDENTITY] * 2
+        self._drvs = {}
+        self._free = []
+        self._leaves = col.defaultdict(list)
+        self._size = 0
+        self._counting = None
+        for rv in drvs:
+            self.add(rv)
+
+    def __len__(self):
+        return len(self._drvs)
+
+    @property
+    def drvs(self):
+        """ The random variables currently in the pool. """
+        return [self._drvs[i] for i in sorted(self._drvs)]
+
+    ## ----- Tree ----- ##
+
+    def _combine(self, i):
+        """ Recompute the node *i* from its children. """
+        (a_off, a), (b_off, b) = self._nodes[2 * i], self._nodes[2 * i + 1]
+        self._nodes[i] = (a_off + b_off, drv.core._convolve(a, b))
+
+    def _set_leaf(self, leaf, dense):
+        """ Set the leaf *leaf* and recompute its ancestors. """
+        i = self._capacity + leaf
+        self._nodes[i] = dense
+        i //= 2
+        while i:
+            self._combine(i)
+            i //= 2
+
+    def _grow(self):
+        """ Double the capacity of the tree, and rebuild it. """
+        leaves = self._nodes[self._capacity:]
+        self._capacity *= 2
+        self._nodes = ([_IDENTITY] * self._capacity + leaves +
+                       [_IDENTITY] * len(leaves))
+        for i in xrange(self._capacity - 1, 0, -1):
+            self._combine(i)
+
+    ## ----- Updates ----- ##
+
+    def add(self, rv, target=None):
+        """ Add the random variable *rv* to the pool; if *target* is given,
+        *rv* counts as a single success if its result is at least *target*
+        (and as nothing otherwise). A pool either sums results or counts
+        successes; the two cannot be mixed. """
+        counting = target is not None
+        if self._drvs and counting != self._counting:
+            raise ValueError("Cannot mix dice with and without a target in "
+                             "one pool.")
+        self._counting = counting
+        if target is None:
+            dense = drv.core._dense(rv)
+        else:
+            p = rv.sf(target - 1)
+            dense = (0, np.array([1 - p, p]))
+
+        if self._free:
+            leaf = self._free.pop()
+        else:
+            if self._size == self._capacity:
+                self._grow()
+            leaf = self._size
+            self._size += 1
+
+        self._set_leaf(leaf, dense)
+        self._drvs[leaf] = rv
+        self._leaves[_key(rv, target)].append(leaf)
+
+    def remove(self, rv, target=None):
+        """ Remove a random variable equal to *rv* (which was added with the
+        same *target*) from the pool. """
+        leaves = self._leaves.get(_key(rv, target))
+        if not leaves:
+            raise ValueError("No such random variable in the pool.")
+        leaf = leaves.pop()
+        self._set_leaf(leaf, _IDENTITY)
+        del self._drvs[leaf]
+        self._free.append(leaf)
+
+    ## ----- Results ----- ##
+
+    def sum(self, name):
+        """ Return the random variable of the sum of the pool (or of its number
+        of successes). """
+        offset, arr = self._nodes[1]
+        return DRV(name, xs=np.arange(len(arr)) + offset, ps=arr)
@@ -0,0 +1,167 @@
+"""
+.. instrument.py
+
+Opt-in instrumentation of operators. Within :func:`recording`, every operator
+invocation -- and every binary step of a reduction -- is recorded, with its
+wall time, the support sizes of its inputs and output, the number of tuples it
+enumerated, the kernel which computed it and whether it was a cache hit::
+
+    with drv.instrument.recording() as recorder:
+        ndk(10, 6) >= 30
+    for record in recorder.summary():
+        print(record)
+    with open('profile.jsonl', 'w') as f:
+        recorder.dump(f)
+
+Records of nested invocations point to their parent, and the time and the
+tuples of a record include those of its children. Outside of
+:func:`recording`, the hooks cost (almost) nothing.
+"""
+
+## Framework
+import drv.core
+
+## Data containers
+import collections as col
+
+## Python basics
+import contextlib
+import itertools as it
+import json
+import timeit
+
+
+## The fields of a record
+FIELDS = ('id', 'parent', 'depth', 'operator', 'name', 'kernel', 'time',
+          'input_sizes', 'output_size', 'tuples', 'cache')
+
+Record = col.namedtuple('Record', FIELDS)
+
+## The active recorders, and the stack of open invocations
+_recorders = []
+_stack = []
+_ids = it.count()
+
+
+###########################
+## ----- Recording ----- ##
+###########################
+
+class Recorder(object):
+    """ A ``Recorder`` collects the records of operator invocations. """
+    def __init__(self):
+        self.records = []
+
+    def dicts(self):
+        """ Return the records as a list of dictionaries. """
+        return [dict(zip(FIELDS, record)) for record in self.records]
+
+    def dump(self, f):
+        """ Write the records to the file object *f*, one JSON object per
+        line. """
+        for d in self.dicts():
+            f.write(json.dumps(d) + '\n')
+
+    def summary(self):
+        """ Return a list of dictionaries, one per (operator, kernel) pair,
+        with the number of calls, total time, total tuples and largest output
+        of their records; the most time consuming are first. """
+        groups = col.OrderedDict()
+        for record in self.records:
+            key = record.operator, record.kernel
+            group = groups.setdefault(key, {
+                'operator': record.operator, 'kernel': record.kernel,
+                'calls': 0, 'time': 0.0, 'tuples': 0, 'max_output_size': 0})
+            group['calls'] += 1
+            group['time'] += record.time
+            group['tuples'] += record.tuples
+            group['max_output_size'] = max(group['max_output_size'],
+                                           record.output_size or 0)
+        return sorted(groups.values(), key=lambda g: -g['time'])
+
+
+@contextlib.contextmanager
+def recording():
+    """ A context manager which records operator invocations, and yields the
+    :class:`Recorder` of these records. """
+    recorder = Recorder()
+    _recorders.append(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorders.remove(recorder)
+
+
+#######################
+## ----- Hooks ----- ##
+#######################
+
+def _size(rv):
+    """ Return the support size of *rv*, or None if it is not known. """
+    xs = getattr(rv, 'xs', None)
+    return None if xs is None else len(xs)
+
+
+def _describe(operator):
+    """ Return a short description of *operator*. """
+    func = getattr(operator, 'function', None)
+    name = getattr(func, '__name__', None) or type(func).__name__
+    return "{}({})".format(type(operator).__name__, name)
+
+
+class _Span(object):
+    """ An open invocation of *operator* on *pool*. """
+    def __init__(self, operator, pool):
+        self.id = next(_ids)
+        self.parent = _stack[-1].id if _stack else None
+        self.depth = len(_stack)
+        self.operator = _describe(operator)
+        self.input_sizes = tuple(_size(rv) for rv in pool.drvs)
+        self.name = self.output_size = None
+        self.kernel = self.cache = None
+        self.tuples = 0
+
+    def __enter__(self):
+        _stack.append(self)
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = timeit.default_timer() - self.start
+        _stack.pop()
+        record = Record(self.id, self.parent, self.depth, self.operator,
+                        self.name, self.kernel, elapsed, self.input_sizes,
+                        self.output_size, self.tuples, self.cache)
+        for recorder in _recorders:
+            recorder.records.append(record)
+
+    def done(self, res):
+        """ Note the result *res* of the invocation. """
+        self.name = getattr(res, 'name', None) or None
+        self.output_size = _size(res)
+
+
+def span(operator, pool):
+    """ Return a context manager of an invocation of *operator* on *pool*,
+    which is recorded if recording. """
+    if not _recorders:
+        return drv.core._NULL_SPAN
+    return _Span(operator, pool)
+
+
+def note(kernel=None, cache=None):
+    """ Note the kernel which computes the innermost open invocation (unless
+    already noted), or its cache outcome ('hit' or 'miss'). """
+    if not _stack:
+        return
+    current = _stack[-1]
+    if kernel and current.kernel is None:
+        current.kernel = kernel
+    if cache:
+        current.cache = cache
+
+
+def count(tuples):
+    """ Count *tuples* enumerated tuples for all open invocations. """
+    for current in _stack:
+        current.tuples += tuples
@@ -0,0 +1,190 @@
+"""
+.. joint.py
+
+Joint discrete random variables; these are random vectors of integers, such as
+the total of a roll together with the number of complications it caused.
+
+A joint random variable is backed by a dense N-dimensional array of
+probabilities, so its marginals and conditionals are array reductions, and the
+sum of independent joint random variables is an N-dimensional convolution.
+"""
+
+## Framework
+import drv.core
+
+## Math
+import numpy as np
+
+## Python basics
+import numbers
+
+
+## Sugar
+DRV = drv.core.DiscreteRandomVariable
+
+
+def _convolve_nd(a, b):
+    """ Return the full N-dimensional convolution of the arrays *a* and *b*;
+    large convolutions are computed via FFT. """
+    import scipy.signal as sig
+    if a.size * b.size <= drv.core.fft_threshold:
+        return sig.convolve(a, b, method='direct')
+    res = sig.fftconvolve(a, b)
+    ## Remove FFT noise around zero
+    res[res < 0] = 0.0
+    return res
+
+
+class JointDiscreteRandomVariable(object):
+    """ A ``JointDiscreteRandomVariable`` is an integer-vector-valued discrete
+    random variable. """
+    def __init__(self, name, xs=None, ps=None, offset=None, array=None):
+        """ A ``JointDiscreteRandomVariable`` may be initialized either with a
+        list of value tuples *xs* with matching probabilities *ps*, or with an
+        *array* of probabilities, where ``array[i]`` is the probability of the
+        value ``offset + i`` (for an index tuple ``i``). """
+        self.name = name
+        if array is not None:
+            self._initialize_with_array(offset, array)
+            return
+
+        self._initialize_with_xp(xs, ps)
+
+    def _initialize_with_array(self, offset, array):
+        """ Initialize with an *offset* and an *array* of probabilities. """
+        array = np.asarray(array, dtype=float)
+        if offset is None:
+            offset = (0,) * array.ndim
+        self.offset = np.array(offset, dtype=int)
+        self.array = array / array.sum()
+
+    def _initialize_with_xp(self, xs, ps):
+        """ Initialize with explicit value tuples and probabilities. """
+        xs = np.array(xs, dtype=int)
+        if xs.ndim != 2:
+            raise ValueError("Values should be tuples of the same length.")
+        offset = xs.min(axis=0)
+        shape = xs.max(axis=0) - offset + 1
+        array = np.zeros(shape)
+        np.add.at(array, tuple((xs - offset).T), ps)
+        self._initialize_with_array(offset, array)
+
+    ## ----- Values ----- ##
+
+    @property
+    def ndim(self):
+        """ The number of components of the random variable. """
+        return self.array.ndim
+
+    @property
+    def xs(self):
+        """ The values (support) of the random variable, as an array whose
+        rows are the value tuples. """
+        return np.argwhere(self.array > 0) + self.offset
+
+    @property
+    def ps(self):
+        """ The probabilities of the random variable. """
+        return self.array[self.array > 0]
+
+    @property
+    def values(self):
+        """ The (value, probability) pairs of the random variable. """
+        return [(tuple(x), p) for x, p in zip(self.xs, self.ps)]
+
+    ## ----- Roll Methods ----- ##
+
+    def __call__(self):
+        return self.roll()
+
+    def roll(self, n=None):
+        """ Roll *n* times, if *n* is given, or else a single time; return the
+        results as a list, if *n* is given, or as a single value otherwise. """
+        size = 1 if n is None else n
+        xs = self.xs
+        idx = np.random.choice(len(xs), size=size, p=self.ps / self.ps.sum())
+        rolls = [tuple(x) for x in xs[idx]]
+        if n is None:
+            return rolls[0]
+        return rolls
+
+    ## ----- Probability Methods ----- ##
+
+    def pmf(self, k):
+        """ Return the probability mass function at the value tuple *k*. """
+        idx = np.asarray(k, dtype=int) - self.offset
+        if (idx < 0).any() or (idx >= self.array.shape).any():
+            return 0.0
+        return self.array[tuple(idx)]
+
+    def pr(self, event):
+        """ Return the probability of *event*; *event* is a boolean function of
+        the value tuple of the random variable. """
+        return sum(p for x, p in self.values if event(x))
+
+    @property
+    def mean(self):
+        """ The mean of the random variable, as an array. """
+        return np.array([self.marginal(i).mean for i in xrange(self.ndim)])
+
+    ## ----- Marginals and Conditionals ----- ##
+
+    def marginal(self, axis, name=None):
+        """ Return the marginal random variable of the component *axis*; if
+        *axis* is a sequence of components, the result is a joint random
+        variable of these components. """
+        axes = [axis] if isinstance(axis, numbers.Integral) else list(axis)
+        others = tuple(i for i in xrange(self.ndim) if i not in axes)
+        array = self.array.sum(axis=others)
+
+        ## The summation keeps the original order of the axes
+        order = np.argsort(np.argsort(axes))
+        array = np.transpose(array, order)
+        offset = self.offset[axes]
+
+        _name = name or "{name}[{axis}]"
+        _name = _name.format(name=self.name, axis=axis)
+        return self._from_array(_name, offset, array)
+
+    def conditional(self, axis, value, name=None):
+        """ Return the random variable of the other components, given that
+        the component *axis* equals *value*. """
+        idx = value - self.offset[axis]
+        if not 0 <= idx < self.array.shape[axis]:
+            raise ValueError("The condition has zero probability.")
+        array = np.take(self.array, idx, axis=axis)
+        if not array.sum() > 0:
+            raise ValueError("The condition has zero probability.")
+        offset = np.delete(self.offset, axis)
+
+        _name = name or "{name}|[{axis}]={value}"
+        _name = _name.format(name=self.name, axis=axis, value=value)
+        return self._from_array(_name, offset, array)
+
+    @staticmethod
+    def _from_array(name, offset, array):
+        """ Return a joint random variable, or a (scalar) random variable if
+        *array* is 1-dimensional. """
+        if array.ndim > 1:
+            return JointDiscreteRandomVariable(name, offset=offset,
+                                               array=array)
+        return DRV(name, xs=np.arange(len(array)) + offset[0], ps=array)
+
+    ## ----- Arithmetic ----- ##
+
+    def __add__(self, other):
+        """ Return the (component-wise) sum of *self* and the independent
+        *other*, which may also be a constant value tuple. """
+        name = "({})+({})".format(self.name, getattr(other, 'name', other))
+        if not isinstance(other, JointDiscreteRandomVariable):
+            offset = self.offset + np.asarray(other, dtype=int)
+            return JointDiscreteRandomVariable(name, offset=offset,
+                                               array=self.array)
+
+        if other.ndim != self.ndim:
+            raise ValueError("Dimensions do not match.")
+        return JointDiscreteRandomVariable(
+            name, offset=self.offset + other.offset,
+            array=_convolve_nd(self.array, other.array))
+
+    __radd__ = __add__
@@ -0,0 +1,59 @@
+"""
+.. lazy.py
+
+Lazily materialized module attributes, so that importing a module of dice
+does not build its dice.
+
+A module declares its lazy attributes at its end, with :func:`attributes`;
+this replaces the module in ``sys.modules`` by a :class:`LazyModule`, which
+builds each lazy attribute (by calling its factory) when it is first accessed,
+and then keeps it. Functions of the module still see the original module's
+globals, so they should call the factories (which should be memoized) rather
+than use the lazy attributes.
+"""
+
+## Python basics
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """ A ``LazyModule`` is a copy of a module, whose attributes in
+    *factories* (a dictionary from names to functions of no arguments) are
+    built when first accessed. """
+    def __init__(self, module, factories):
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        vars(self).update(vars(module))
+        ## The original module is kept alive, as its functions use its globals
+        vars(self)['_module'] = module
+        vars(self)['_factories'] = factories
+        if '__all__' not in vars(module):
+            public = [name for name, value in vars(module).items()
+                      if not (name.startswith('_') or
+                              isinstance(value, types.ModuleType))]
+            vars(self)['__all__'] = sorted(set(public) | set(factories))
+
+    def __getattr__(self, name):
+        ## This is called only for attributes which were not found
+        try:
+            factory = self._factories[name]
+        except KeyError:
+            raise AttributeError("'module' object has no attribute "
+                                 "'{}'".format(name))
+        value = factory()
+        setattr(self, name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        ## Keep the globals of the original module up to date
+        types.ModuleType.__setattr__(self, name, value)
+        setattr(self._module, name, value)
+
+    def __dir__(self):
+        return sorted(set(vars(self)) | set(self._factories))
+
+
+def attributes(name, factories):
+    """ Make the module *name* lazy, with the lazy attributes *factories* (a
+    dictionary from names to functions of no arguments). """
+    sys.modules[name] = LazyModule(sys.modules[name], factories)
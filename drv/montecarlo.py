@@ -0,0 +1,288 @@
+"""
+.. montecarlo.py
+
+Monte Carlo estimates of operators which are too expensive to enumerate.
+
+Rolls are drawn in vectorized blocks, and their results are kept in a
+streaming histogram. After every block, a confidence interval (Wilson or
+Clopper-Pearson) is computed for the probability of every observed result;
+sampling stops once the widest interval is narrow enough, once the time budget
+is spent, or once enough rolls are drawn. The result is an
+:class:`EstimatedDiscreteRandomVariable` -- a discrete random variable (with
+the whole API of one) whose probabilities are the observed frequencies, and
+which knows their error bars.
+
+Sampling is requested by passing *sampling* to an operator or to a pool
+method; it is either True (for the default options below) or a dictionary of
+options of :func:`estimate`::
+
+    pool.sum('10000d6', sampling={'precision': 1e-3, 'time_budget': 0.5})
+"""
+
+## Framework
+import drv.core
+import drv.instrument
+
+## Math
+import numpy as np
+
+## Data containers
+import collections as col
+
+## Python basics
+import timeit
+
+
+## Default options of :func:`estimate`
+defaults = {
+    'precision': 1e-3,
+    'confidence': 0.95,
+    'method': 'wilson',
+    'time_budget': None,
+    'max_samples': 10 ** 7,
+    'block': 10 ** 6,
+}
+
+
+##################################
+## ----- Helper Functions ----- ##
+##################################
+
+def _z(confidence):
+    """ Return the two-sided standard normal quantile of *confidence*. """
+    import scipy.special as sp
+    return sp.ndtri(0.5 + confidence / 2.)
+
+
+def wilson(counts, n, confidence):
+    """ Return the arrays (low, high) of the Wilson score intervals of the
+    proportions *counts* / *n*. """
+    counts = np.asarray(counts, dtype=float)
+    z2 = _z(confidence) ** 2
+    p = counts / n
+    center = (p + z2 / (2 * n)) / (1 + z2 / n)
+    half = np.sqrt(p * (1 - p) / n + z2 / (4. * n ** 2)) * np.sqrt(z2) / \
+        (1 + z2 / n)
+    return np.clip(center - half, 0, 1), np.clip(center + half, 0, 1)
+
+
+def clopper_pearson(counts, n, confidence):
+    """ Return the arrays (low, high) of the (exact) Clopper-Pearson intervals
+    of the proportions *counts* / *n*. """
+    import scipy.special as sp
+    counts = np.asarray(counts, dtype=float)
+    alpha = 1 - confidence
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low = sp.betaincinv(counts, n - counts + 1, alpha / 2)
+        high = sp.betaincinv(counts + 1, n - counts, 1 - alpha / 2)
+    low = np.where(counts == 0, 0.0, low)
+    high = np.where(counts == n, 1.0, high)
+    return low, high
+
+
+intervals = {
+    'wilson': wilson,
+    'clopper-pearson': clopper_pearson,
+}
+
+
+def _sampler(rv):
+    """ Return a function which draws an array (of a given shape) of rolls of
+    *rv*. """
+    xs = np.asarray(rv.xs)
+    cdf = np.cumsum(rv.ps)
+    cdf /= cdf[-1]
+
+    def sample(shape):
+        idx = np.searchsorted(cdf, np.random.random_sample(shape),
+                              side='right')
+        return xs[np.minimum(idx, len(xs) - 1)]
+    return sample
+
+
+def _evaluator(operator):
+    """ Return a function of a 2-dimensional array of rolls (a row per roll
+    of the pool), which returns the array of the operator's results.
+    Reductions fold their binary operator along every row:
+
+    >>> high = drv.core.ReduceOperator(lambda a, b: max(a, b), unpack=True)
+    >>> _evaluator(high)(np.array([[1, 5, 2, 3], [4, 4, 1, 6]]))
+    array([5, 6])
+    >>> keep = drv.core.MemoryReduceOperator(
+    ...     drv.core._tuple(2), sum, drv.core._get_n_highest(2), unpack=True)
+    >>> _evaluator(keep)(np.array([[1, 5, 2, 3], [4, 4, 1, 6]]))
+    array([ 8, 10])
+    """
+    import drv.planner
+    func = drv.planner._vectorized(operator)
+    if func is not None:
+        return func
+    if not isinstance(operator, drv.core.ReduceOperator):
+        return lambda rolls: np.array(
+            [drv.core._to_int(operator.operator(tuple(row)))
+             for row in rolls.tolist()], dtype=np.int64)
+
+    cast = getattr(operator, 'cast', lambda x: x)
+    uncast = getattr(operator, 'uncast', lambda x: x)
+
+    def binary(a, b):
+        return operator.operator((a, b))
+    return lambda rolls: np.array(
+        [drv.core._to_int(uncast(reduce(binary, [cast(x) for x in row])))
+         for row in rolls.tolist()], dtype=np.int64)
+
+
+def _roller(drvs):
+    """ Return a function which draws a given number of rolls of the pool of
+    *drvs*, as a 2-dimensional array with a row per roll; identical random
+    variables are drawn together. """
+    columns = col.OrderedDict()
+    for i, rv in enumerate(drvs):
+        columns.setdefault(id(rv), (rv, []))[1].append(i)
+    samplers = [(_sampler(rv), idx) for rv, idx in columns.values()]
+
+    def roll(size):
+        rolls = np.empty((size, len(drvs)), dtype=np.int64)
+        for sample, idx in samplers:
+            rolls[:, idx] = sample((size, len(idx)))
+        return rolls
+    return roll
+
+
+class _Histogram(object):
+    """ A streaming histogram of integers. """
+    def __init__(self):
+        self.offset = 0
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.n = 0
+
+    def add(self, results):
+        low, high = results.min(), results.max()
+        if not self.n:
+            self.offset = low
+        start = min(low, self.offset)
+        end = max(high + 1, self.offset + len(self.counts))
+        if (start, end) != (self.offset, self.offset + len(self.counts)):
+            counts = np.zeros(end - start, dtype=np.int64)
+            counts[self.offset - start:
+                   self.offset - start + len(self.counts)] = self.counts
+            self.offset, self.counts = start, counts
+        self.counts += np.bincount(results - self.offset,
+                                   minlength=len(self.counts))
+        self.n += len(results)
+
+    def observed(self):
+        """ Return the arrays of the observed values and their counts. """
+        nz = np.flatnonzero(self.counts)
+        return nz + self.offset, self.counts[nz]
+
+
+############################
+## ----- Estimation ----- ##
+############################
+
+class EstimatedDiscreteRandomVariable(drv.core.DiscreteRandomVariable):
+    """ An ``EstimatedDiscreteRandomVariable`` is a discrete random variable
+    whose probabilities are the frequencies of the values *xs* (given by
+    *counts*) in *samples* rolls; it knows the confidence intervals of these
+    probabilities. Values which were never rolled are missing altogether. """
+    def __init__(self, name, xs, counts, samples, confidence=0.95,
+                 method='wilson'):
+        counts = np.asarray(counts, dtype=np.int64)
+        self._initialize_with_arrays(name, np.asarray(xs),
+                                     counts / float(samples))
+        self.counts = counts
+        self.samples = samples
+        self.confidence = confidence
+        self.method = method
+        self.lower, self.upper = intervals[self.method](
+            counts, samples, self.confidence)
+
+    @property
+    def precision(self):
+        """ The largest half-width of the probabilities' intervals. """
+        return (self.upper - self.lower).max() / 2.
+
+    def _bounds(self, k, cum):
+        k = np.asarray(k)
+        idx = np.searchsorted(self.xs, k, side='right')
+        counts = np.concatenate(([0], np.cumsum(self.counts)))[idx]
+        if not cum:
+            hit = (idx > 0) & (self.xs[np.maximum(idx - 1, 0)] == k)
+            counts = np.where(hit, self.counts[np.maximum(idx - 1, 0)], 0)
+        low, high = intervals[self.method](counts, self.samples,
+                                           self.confidence)
+        return low[()], high[()]
+
+    def pmf_bounds(self, k):
+        """ Return the confidence interval (low, high) of the probability
+        mass function at *k*. """
+        return self._bounds(k, cum=False)
+
+    def cdf_bounds(self, k):
+        """ Return the confidence interval (low, high) of the cumulative
+        distribution function at *k*. """
+        return self._bounds(k, cum=True)
+
+    @property
+    def mean_error(self):
+        """ The half-width of the (normal) confidence interval of the mean.
+        """
+        return _z(self.confidence) * self.std / np.sqrt(self.samples)
+
+
+def estimate(operator, pool, name, **options):
+    """ Return the :class:`EstimatedDiscreteRandomVariable` of *operator* on
+    *pool*, named *name* (which is formatted like operators' names).
+
+    Rolls are drawn in blocks of (at most) *block* rolls of single dice,
+    until the confidence intervals (of level *confidence*, computed by
+    *method*, which is either 'wilson' or 'clopper-pearson') of all observed
+    results have half-widths of at most *precision*, until *time_budget*
+    seconds have passed, or until *max_samples* rolls were drawn -- whichever
+    comes first. Options which are not given are taken from ``defaults``. """
+    unknown = set(options) - set(defaults)
+    if unknown:
+        raise ValueError("Unknown options {}.".format(sorted(unknown)))
+    options = dict(defaults, **options)
+    precision, confidence, method, time_budget, max_samples, block = [
+        options[key] for key in ('precision', 'confidence', 'method',
+                                 'time_budget', 'max_samples', 'block')]
+    if method not in intervals:
+        raise ValueError("Unknown interval method {}.".format(method))
+
+    drv.instrument.note(kernel='monte_carlo')
+    roll = _roller(pool.drvs)
+    rows = max(block // len(pool.drvs), 1)
+    evaluate = _evaluator(operator)
+    histogram = _Histogram()
+    start = timeit.default_timer()
+    while True:
+        size = min(rows, max_samples - histogram.n)
+        histogram.add(np.asarray(evaluate(roll(size)), dtype=np.int64))
+        drv.instrument.count(size)
+
+        if histogram.n >= max_samples:
+            break
+        if time_budget is not None and \
+                timeit.default_timer() - start >= time_budget:
+            break
+        _, counts = histogram.observed()
+        low, high = intervals[method](counts, histogram.n, confidence)
+        if (high - low).max() / 2. <= precision:
+            break
+
+    formatter = dict(("_{i}".format(i=i), rv)
+                     for i, rv in enumerate(pool.drvs))
+    xs, counts = histogram.observed()
+    return EstimatedDiscreteRandomVariable(name.format(**formatter), xs,
+                                           counts, histogram.n,
+                                           confidence=confidence,
+                                           method=method)
+
+
+def sample(operator, pool, name, sampling):
+    """ Return the estimate of *operator* on *pool*, where *sampling* is
+    either True or a dictionary of options of :func:`estimate`. """
+    options = sampling if isinstance(sampling, dict) else {}
+    return estimate(operator, pool, name, **options)
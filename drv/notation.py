@@ -0,0 +1,407 @@
+"""
+.. notation.py
+
+Standard dice notation; for example ``4d6kh3+2``, ``3d10>=7``, ``2d20kl1`` or
+``d66``.
+
+An expression is parsed into a typed expression tree, which is compiled into a
+plan; a plan is a function which computes the expression's random variable
+with the fastest kernels available (dense convolution powers, order
+statistics, and so on). Plans and results are cached by the normalized
+expression.
+
+The grammar is::
+
+    expr   := term (('+' | '-') term)*
+    term   := unary ('*' unary)*
+    unary  := '-' unary | atom
+    atom   := NUMBER | dice | '(' expr ')'
+    dice   := [NUMBER] 'd' (NUMBER | '%' | 'f') ['!' | '!!'] [reroll] [keep]
+              [compare NUMBER]
+    reroll := ('r' | 'ro') ('<' | '<=') NUMBER
+    keep   := ('kh' | 'kl' | 'k' | 'dh' | 'dl') NUMBER
+
+``d66`` is a pair of d6, read as tens and units. ``!!`` compounds exploding
+dice into a single result, and ``!`` explodes into extra dice, which matters
+only when counting successes. A comparison turns the dice into the number of
+dice which satisfy it.
+
+Before an expression is compiled, the bounds of the values of each of its
+subexpressions are computed, and the expression is rejected if any of them
+spans more than ``max_width`` integers, if a constant is larger than
+``max_constant``, if dice are more than ``max_count`` dice or have more than
+``max_sides`` sides, or if keeping dice or multiplying is estimated to take
+more than ``max_work`` steps (about ten seconds). Only the ``cache_size`` most
+recent expressions are cached, so a long-lived process may evaluate untrusted
+expressions.
+"""
+
+## Framework
+import drv.core
+import drv.dice.base
+
+## Math
+import numpy as np
+
+## Data containers
+import collections as col
+
+## Parsing
+import re
+
+
+## Sugar
+DRV = drv.core.DiscreteRandomVariable
+
+
+## Limits of dice, constants, supports and work, and the number of cached
+## plans and results
+max_count = 1000
+max_sides = 1000
+max_constant = 10 ** 6
+max_width = 10 ** 6
+max_work = 10 ** 10
+cache_size = 1024
+
+## The cost of a step of a Python loop, in steps of array operations
+_PYTHON_STEP = 4000
+
+
+class NotationError(ValueError):
+    """ An error in a dice expression. """
+
+
+#################################
+## ----- Expression Tree ----- ##
+#################################
+
+Constant = col.namedtuple('Constant', 'value')
+Dice = col.namedtuple('Dice', 'count sides explode reroll keep')
+Successes = col.namedtuple('Successes', 'dice compare target')
+Negation = col.namedtuple('Negation', 'operand')
+BinaryOperation = col.namedtuple('BinaryOperation', 'operator left right')
+
+
+#########################
+## ----- Parsing ----- ##
+#########################
+
+_TOKEN = re.compile(r"\d+|!!|>=|<=|kh|kl|dh|dl|ro|[d%f!kr<>=+\-*()]")
+
+
+def normalize(expression):
+    """ Return the normalized form of *expression*; this is the key by which
+    plans and results are cached. """
+    return re.sub(r"\s+", "", expression).lower()
+
+
+def _tokenize(expression):
+    """ Return the list of tokens of a normalized *expression*. """
+    tokens = _TOKEN.findall(expression)
+    if "".join(tokens) != expression:
+        raise NotationError("Invalid expression {}.".format(expression))
+    return tokens
+
+
+class _Parser(object):
+    """ A recursive descent parser of the grammar above. """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.i = 0
+
+    def peek(self):
+        if self.i < len(self.tokens):
+            return self.tokens[self.i]
+        return None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise NotationError("Unexpected end of expression.")
+        self.i += 1
+        return token
+
+    def accept(self, *tokens):
+        if self.peek() in tokens:
+            return self.next()
+        return None
+
+    def number(self):
+        token = self.next()
+        if not token.isdigit():
+            raise NotationError("Expected a number, got {}.".format(token))
+        return int(token)
+
+    def parse(self):
+        tree = self.expr()
+        if self.peek() is not None:
+            raise NotationError("Unexpected {}.".format(self.peek()))
+        return tree
+
+    def expr(self):
+        tree = self.term()
+        while True:
+            operator = self.accept('+', '-')
+            if not operator:
+                return tree
+            tree = BinaryOperation(operator, tree, self.term())
+
+    def term(self):
+        tree = self.unary()
+        while self.accept('*'):
+            tree = BinaryOperation('*', tree, self.unary())
+        return tree
+
+    def unary(self):
+        if self.accept('-'):
+            return Negation(self.unary())
+        return self.atom()
+
+    def atom(self):
+        if self.accept('('):
+            tree = self.expr()
+            if not self.accept(')'):
+                raise NotationError("Expected ).")
+            return tree
+        count = 1
+        if self.peek() is not None and self.peek().isdigit():
+            count = self.number()
+            if self.peek() != 'd':
+                return Constant(count)
+        if not self.accept('d'):
+            raise NotationError("Unexpected {}.".format(self.peek()))
+        return self.dice(count)
+
+    def dice(self, count):
+        if self.accept('%'):
+            sides = 100
+        elif self.accept('f'):
+            sides = 'f'
+        else:
+            sides = self.number()
+            if sides < 1:
+                raise NotationError("Dice should have at least one side.")
+
+        explode = self.accept('!', '!!')
+
+        reroll = None
+        once = self.accept('r', 'ro')
+        if once:
+            compare = self.accept('<', '<=')
+            if not compare:
+                raise NotationError("Expected < or <= after a reroll.")
+            below = self.number() + (compare == '<=')
+            reroll = (below, once == 'ro')
+
+        if explode and reroll:
+            raise NotationError("Cannot both explode and reroll.")
+
+        keep = None
+        kind = self.accept('kh', 'kl', 'k', 'dh', 'dl')
+        if kind:
+            keep = (kind, self.number())
+
+        if count > max_count:
+            raise NotationError("At most {} dice are allowed.".format(
+                max_count))
+        if sides != 'f' and sides > max_sides:
+            raise NotationError("Dice of at most {} sides are allowed.".format(
+                max_sides))
+        dice = Dice(count, sides, explode, reroll, keep)
+
+        compare = self.accept('>=', '<=', '>', '<', '=')
+        if compare:
+            if keep:
+                raise NotationError("Cannot count successes of kept dice.")
+            return Successes(dice, compare, self.number())
+        return dice
+
+
+def parse(expression):
+    """ Return the expression tree of *expression*. """
+    return _Parser(_tokenize(normalize(expression))).parse()
+
+
+###########################
+## ----- Compiling ----- ##
+###########################
+
+## Plans are functions of no arguments, which return the dense representation
+## (offset, array) of the expression; see :func:`drv.core._dense`.
+
+def _die(dice):
+    """ Return the random variable of a single die of *dice*. """
+    if dice.sides == 'f':
+        return drv.core._from_dense('dF', -1, np.repeat(1. / 3, 3))
+    if dice.sides == 66 and not (dice.explode or dice.reroll):
+        return drv.core._from_dense('d66', 0, np.bincount(
+            [10 * a + b for a in xrange(1, 7) for b in xrange(1, 7)]) / 36.)
+    if dice.explode:
+        return drv.dice.base.compounding_dk(dice.sides)
+    if dice.reroll:
+        below, once = dice.reroll
+        return drv.dice.base.reroll_dk(dice.sides, below, once=once)
+    return drv.dice.base.dk(dice.sides)
+
+
+def _keep(dice):
+    """ Return the pair (number of kept dice, whether the highest are kept) of
+    *dice* which keep some of their dice. """
+    kind, n = dice.keep
+    if kind.startswith('d'):
+        ## Dropping the n highest is keeping the rest lowest, and vice versa
+        kind, n = ('kl' if kind == 'dh' else 'kh'), dice.count - n
+    return min(max(n, 0), dice.count), kind != 'kl'
+
+
+def _compile_dice(dice):
+    die = _die(dice)
+    if dice.keep is None:
+        return lambda: drv.core._dense_power(die, dice.count)
+
+    n, highest = _keep(dice)
+    return lambda: drv.core._iid_keep_sum(die, dice.count, n, highest)
+
+
+_COMPARE = {
+    '>=': lambda xs, t: xs >= t,
+    '>': lambda xs, t: xs > t,
+    '<=': lambda xs, t: xs <= t,
+    '<': lambda xs, t: xs < t,
+    '=': lambda xs, t: xs == t,
+}
+
+
+def _success_die(node):
+    """ Return the random variable of the number of successes of a single die
+    of the :class:`Successes` *node*. """
+    dice = node.dice
+    if dice.explode == '!' and dice.sides != 'f':
+        if node.compare not in ('>=', '>'):
+            raise NotationError("Exploding dice count only high successes.")
+        target = node.target + (node.compare == '>')
+        return drv.dice.base.exploding_dk(dice.sides, target)
+    rv = _die(dice)
+    p = rv.ps[_COMPARE[node.compare](rv.xs, node.target)].sum()
+    return drv.core._from_dense('success', 0, np.array([1 - p, p]))
+
+
+def _compile_successes(node):
+    die = _success_die(node)
+    return lambda: drv.core._dense_power(die, node.dice.count)
+
+
+def _compile_binary(node):
+    left, right = _compile(node.left), _compile(node.right)
+    if node.operator == '*':
+        def plan():
+            a, b = _to_drv(left()), _to_drv(right())
+            return drv.core._dense(a * b)
+        return plan
+
+    sign = 1 if node.operator == '+' else -1
+
+    def plan():
+        (a_off, a), (b_off, b) = left(), right()
+        if sign < 0:
+            b_off, b = -(b_off + len(b) - 1), b[::-1]
+        return a_off + b_off, drv.core._convolve(a, b)
+    return plan
+
+
+def _compile_negation(node):
+    operand = _compile(node.operand)
+
+    def plan():
+        offset, arr = operand()
+        return -(offset + len(arr) - 1), arr[::-1]
+    return plan
+
+
+def _compile(node):
+    """ Return the plan of the expression tree *node*. """
+    if isinstance(node, Constant):
+        return lambda: (node.value, np.ones(1))
+    if isinstance(node, Dice):
+        return _compile_dice(node)
+    if isinstance(node, Successes):
+        return _compile_successes(node)
+    if isinstance(node, Negation):
+        return _compile_negation(node)
+    if isinstance(node, BinaryOperation):
+        return _compile_binary(node)
+    raise NotationError("Unknown node {}.".format(node))
+
+
+def _check_work(work, what):
+    if work > max_work:
+        raise NotationError("{} takes too long.".format(what))
+
+
+def _check(node):
+    """ Return the bounds (low, high) of the values of the expression tree
+    *node*, making sure that evaluating it is within the limits. """
+    if isinstance(node, Constant):
+        if node.value > max_constant:
+            raise NotationError("Constants of at most {} are allowed.".format(
+                max_constant))
+        low = high = node.value
+    elif isinstance(node, (Dice, Successes)):
+        dice = node if isinstance(node, Dice) else node.dice
+        die = _success_die(node) if isinstance(node, Successes) else \
+            _die(node)
+        low, high, count = int(die.xs[0]), int(die.xs[-1]), dice.count
+        if isinstance(node, Dice) and node.keep is not None:
+            count = _keep(node)[0]
+            ## See :func:`drv.core._iid_keep_sum`
+            steps = len(die.xs) * (dice.count + 1) * (dice.count + 2) // 2
+            _check_work(steps * (count * (high - low) + 1 + _PYTHON_STEP),
+                        "Keeping dice")
+        low, high = count * low, count * high
+    elif isinstance(node, Negation):
+        low, high = _check(node.operand)
+        low, high = -high, -low
+    elif isinstance(node, BinaryOperation):
+        (a, b), (c, d) = _check(node.left), _check(node.right)
+        if node.operator == '+':
+            low, high = a + c, b + d
+        elif node.operator == '-':
+            low, high = a - d, b - c
+        else:
+            _check_work((b - a + 1) * (d - c + 1) * _PYTHON_STEP,
+                        "Multiplying")
+            corners = a * c, a * d, b * c, b * d
+            low, high = min(corners), max(corners)
+    else:
+        raise NotationError("Unknown node {}.".format(node))
+
+    if high - low + 1 > max_width:
+        raise NotationError("Values may span at most {} integers.".format(
+            max_width))
+    return low, high
+
+
+def _to_drv(dense, name='expression'):
+    return drv.core._from_dense(name, *dense)
+
+
+@drv.core.bounded_memoize(cache_size)
+def _plan(normalized):
+    tree = _Parser(_tokenize(normalized)).parse()
+    _check(tree)
+    return _compile(tree)
+
+
+def plan(expression):
+    """ Return the (cached) plan of *expression*. """
+    return _plan(normalize(expression))
+
+
+@drv.core.bounded_memoize(cache_size)
+def _evaluate(normalized):
+    return _to_drv(_plan(normalized)(), normalized)
+
+
+def evaluate(expression):
+    """ Return the (cached) random variable of *expression*. """
+    return _evaluate(normalize(expression))
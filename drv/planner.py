@@ -0,0 +1,388 @@
+"""
+.. planner.py
+
+A cost-model planner of operator invocations. Before anything is enumerated,
+the planner estimates the time and memory of every kernel which may compute
+the operator on the pool, from the support sizes of the pool and from the
+operator's properties (its ``kind``), and runs the cheapest kernel which fits
+within ``latency_budget`` seconds and ``memory_cap`` bytes. The kernels are:
+
+- ``dense`` -- convolution of dense arrays (sums and differences);
+- ``sparse`` -- pairwise reduction over the supports (the classic path of
+  reduce operators);
+- ``order`` -- order statistics (maxima and minima of any pool, and sums of
+  the highest or lowest results of identical dice);
+- ``multiset`` -- enumeration of the multisets of results of identical dice,
+  for symmetric operators;
+- ``product`` -- enumeration of all tuples of results;
+- ``monte_carlo`` -- an estimate from random samples (see
+  :mod:`drv.montecarlo`), used only if no exact kernel fits.
+
+The chosen :class:`Plan` (the kernel and the reason for choosing it) is the
+``plan`` attribute of the result. Invocations on pools which are small enough
+(see ``drv.core.max_direct_tuples``) are not planned; they are computed
+directly by the operator, and their plan's kernel is ``direct`` (and that of
+results of :mod:`drv.cache` is ``cache``).
+"""
+
+## Framework
+import drv.core
+import drv.instrument
+
+## Math
+import numpy as np
+
+## Data containers
+import collections as col
+
+## Python basics
+import itertools as it
+import math
+
+
+## Budgets; a kernel is chosen only if its estimated time (in seconds) and
+## memory (in bytes) are within these
+latency_budget = 60.0
+memory_cap = 2 ** 30
+
+## The number of samples of Monte Carlo estimates; if None, queries which no
+## exact kernel fits raise an error instead
+monte_carlo_samples = 10 ** 5
+
+## Throughputs of the kernels' inner loops (operations per second), and memory
+## per stored outcome (bytes), of the cost model
+RATES = {
+    'dense': 1e8,
+    'sparse': 1e6,
+    'order': 1e7,
+    'multiset': 3e5,
+    'product': 5e5,
+    'monte_carlo': 1e7,
+}
+OUTCOME_BYTES = 100
+
+Plan = drv.core.Plan
+
+
+##################################
+## ----- Helper Functions ----- ##
+##################################
+
+def _format(name, pool):
+    formatter = dict(("_{i}".format(i=i), rv)
+                     for i, rv in enumerate(pool.drvs))
+    return name.format(**formatter)
+
+
+def _width(rv):
+    return int(rv.xs[-1] - rv.xs[0]) + 1
+
+
+def _groups(drvs):
+    """ Return a list of (random variable, count) pairs of the identically
+    distributed random variables of *drvs*. """
+    groups = col.OrderedDict()
+    for rv in drvs:
+        key = (np.asarray(rv.xs).tostring(), np.asarray(rv.ps).tostring())
+        groups.setdefault(key, [rv, 0])[1] += 1
+    return [tuple(g) for g in groups.values()]
+
+
+def _n_multisets(n, k):
+    """ The (approximate) number of multisets of size *n* of *k* values. """
+    return math.exp(math.lgamma(n + k) - math.lgamma(n + 1) -
+                    math.lgamma(k))
+
+
+def _symmetric(operator):
+    """ Return a function of a tuple of results which computes *operator*, if
+    *operator* is symmetric (invariant under permuting its arguments), or
+    None. """
+    kind = getattr(operator, 'kind', None)
+    if kind in ('sum', 'mul', 'max', 'min'):
+        return operator.operator
+    if kind == 'keep_sum':
+        n = operator.keep
+        return lambda xs: sum(sorted(xs)[-n:])
+    if kind == 'nth_highest':
+        n = operator.keep
+        return lambda xs: sorted(xs)[-n]
+    return None
+
+
+def _vectorized(operator):
+    """ Return a function of a 2-dimensional array of samples (a row per
+    sample), which computes *operator* on every row, or None. """
+    kind = getattr(operator, 'kind', None)
+    if kind == 'sum':
+        return lambda a: a.sum(axis=1)
+    if kind == 'mul':
+        return lambda a: a.prod(axis=1)
+    if kind == 'max':
+        return lambda a: a.max(axis=1)
+    if kind == 'min':
+        return lambda a: a.min(axis=1)
+    if kind == 'sub':
+        return lambda a: a[:, 0] - a[:, 1]
+    if kind == 'keep_sum':
+        return lambda a: np.sort(a, axis=1)[:, -operator.keep:].sum(axis=1)
+    if kind == 'nth_highest':
+        return lambda a: np.sort(a, axis=1)[:, -operator.keep]
+    return None
+
+
+################################
+## ----- Cost Estimates ----- ##
+################################
+
+## Each estimate gets the operator and the random variables of the pool, and
+## returns the (time, memory) of its kernel, or None if it does not apply.
+
+def _dense_cost(operator, rvs):
+    if getattr(operator, 'kind', None) not in ('sum', 'sub'):
+        return None
+    width, ops = _width(rvs[0]), 0
+    for rv in rvs[1:]:
+        w = _width(rv)
+        ops += min(width * w, 10 * (width + w) * math.log(width + w, 2))
+        width += w - 1
+    return ops / RATES['dense'], 24 * width
+
+
+def _sparse_cost(operator, rvs):
+    if not isinstance(operator, drv.core.ReduceOperator):
+        return None
+    kind = getattr(operator, 'kind', None)
+    values = len(set().union(*(rv.xs.tolist() for rv in rvs)))
+    size, width, ops, largest = len(rvs[0].xs), _width(rvs[0]), 0, 0
+    for i, rv in enumerate(rvs[1:], 2):
+        ops += size * len(rv.xs)
+        width += _width(rv) - 1
+        if kind == 'sum':
+            bound = width
+        elif kind in ('max', 'min'):
+            bound = values
+        elif kind == 'mul':
+            bound = size * len(rv.xs)
+        elif kind in ('keep_sum', 'nth_highest'):
+            ## States are the (up to) keep highest results
+            bound = _n_multisets(min(operator.keep, i), values + 1)
+        else:
+            ## Nothing is known about other reductions; their results are
+            ## assumed to be spread no more than sums are
+            bound = width
+        size = min(size * len(rv.xs), bound)
+        largest = max(largest, size)
+    return ops / RATES['sparse'], OUTCOME_BYTES * largest
+
+
+def _order_cost(operator, rvs):
+    kind = getattr(operator, 'kind', None)
+    if kind in ('max', 'min'):
+        values = sum(len(rv.xs) for rv in rvs)
+        return len(rvs) * values / RATES['order'], 24 * values
+    if kind == 'keep_sum' and len(_groups(rvs)) == 1:
+        n, m, k = len(rvs), min(operator.keep, len(rvs)), len(rvs[0].xs)
+        size = m * (_width(rvs[0]) - 1) + 1
+        return k * n * n * size / RATES['order'], 16 * (n + 1) * size
+    return None
+
+
+def _multiset_cost(operator, rvs):
+    if _symmetric(operator) is None:
+        return None
+    if getattr(operator, 'kind', None) == 'nth_highest' and \
+            len(rvs) < operator.keep:
+        return None
+    count = 1
+    for rv, n in _groups(rvs):
+        count *= _n_multisets(n, len(rv.xs))
+    return count * len(rvs) / RATES['multiset'], OUTCOME_BYTES * count
+
+
+def _product_cost(operator, rvs):
+    ## Reductions are of binary operators, which are not applied to tuples
+    if isinstance(operator, drv.core.ReduceOperator):
+        return None
+    count = reduce(lambda a, b: a * b, (float(len(rv.xs)) for rv in rvs))
+    return count * len(rvs) / RATES['product'], OUTCOME_BYTES * count
+
+
+_COSTS = col.OrderedDict([
+    ('dense', _dense_cost),
+    ('order', _order_cost),
+    ('sparse', _sparse_cost),
+    ('multiset', _multiset_cost),
+    ('product', _product_cost),
+])
+
+
+def _monte_carlo_samples(operator, rvs):
+    """ Return the number of samples which fit the budgets (but at most
+    ``monte_carlo_samples``). """
+    per_sample = len(rvs) / RATES['monte_carlo']
+    if _vectorized(operator) is None:
+        per_sample *= RATES['monte_carlo'] / RATES['product']
+    fit = min(latency_budget / per_sample if latency_budget else np.inf,
+              memory_cap / (16. * len(rvs)) if memory_cap else np.inf)
+    return int(max(min(monte_carlo_samples, fit), 1))
+
+
+#########################
+## ----- Kernels ----- ##
+#########################
+
+## Each kernel gets the operator, the pool and the name of the result, and
+## returns the random variable of the result; the name is already formatted,
+## except for the sparse and product kernels, which format it themselves.
+
+def _dense(operator, pool, name):
+    denses = [drv.core._dense(rv) for rv in pool.drvs]
+    if operator.kind == 'sub':
+        (a_off, a), (b_off, b) = denses
+        denses = [(a_off, a), (-(b_off + len(b) - 1), b[::-1])]
+    offset, arr = denses[0]
+    for b_off, b in denses[1:]:
+        offset, arr = offset + b_off, drv.core._convolve(arr, b)
+    return drv.core._from_dense(name, offset, arr)
+
+
+def _sparse(operator, pool, name):
+    return operator._operate(pool, name)
+
+
+def _order(operator, pool, name):
+    if operator.kind == 'keep_sum':
+        rv = pool.drvs[0]
+        offset, arr = drv.core._iid_keep_sum(rv, len(pool.drvs),
+                                             operator.keep)
+        return drv.core._from_dense(name, offset, arr)
+
+    ## The CDF of the maximum is the product of the CDFs, and the survival
+    ## function of the minimum is the product of the survival functions
+    xs = np.unique(np.concatenate([rv.xs for rv in pool.drvs]))
+    cdfs = []
+    for rv in pool.drvs:
+        cum = np.cumsum(rv.ps)
+        idx = np.searchsorted(rv.xs, xs, side='right')
+        cdfs.append(np.where(idx > 0, cum[np.maximum(idx - 1, 0)], 0.0))
+    if operator.kind == 'max':
+        cdf = np.prod(cdfs, axis=0)
+    else:
+        cdf = 1 - np.prod([1 - c for c in cdfs], axis=0)
+    ## Remove rounding noise around zero
+    ps = np.maximum(np.diff(np.concatenate(([0.0], cdf))), 0)
+    return drv.core.DiscreteRandomVariable(name, xs=xs, ps=ps)
+
+
+def _multiset(operator, pool, name):
+    func = _symmetric(operator)
+    per_group = []
+    for rv, n in _groups(pool.drvs):
+        outcomes = []
+        log_nf = math.lgamma(n + 1)
+        for idx in it.combinations_with_replacement(xrange(len(rv.xs)), n):
+            counts = np.bincount(idx, minlength=len(rv.xs))
+            ## The multinomial probability of the multiset
+            logp = (log_nf - sum(math.lgamma(c + 1) for c in counts if c) +
+                    np.dot(counts, np.log(rv.ps)))
+            outcomes.append((tuple(rv.xs[list(idx)]), math.exp(logp)))
+        per_group.append(outcomes)
+        drv.instrument.count(len(outcomes))
+
+    d = col.defaultdict(float)
+    for combination in it.product(*per_group):
+        xs = sum((x for x, _ in combination), ())
+        p = np.prod([q for _, q in combination])
+        d[drv.core._to_int(func(xs))] += p
+    return drv.core.DiscreteRandomVariable(name, xs=d.keys(), ps=d.values())
+
+
+def _product(operator, pool, name):
+    return drv.core.Operator._operate(operator, pool, name)
+
+
+def _monte_carlo(operator, pool, name, samples):
+    import drv.montecarlo
+    return drv.montecarlo.estimate(operator, pool, name, max_samples=samples,
+                                   time_budget=latency_budget)
+
+
+_KERNELS = {
+    'dense': _dense,
+    'sparse': _sparse,
+    'order': _order,
+    'multiset': _multiset,
+    'product': _product,
+}
+
+
+##########################
+## ----- Planning ----- ##
+##########################
+
+def _fmt(time, memory):
+    return "{:.3g}s, {:.3g}MB".format(time, memory / 2. ** 20)
+
+
+def plan(operator, pool):
+    """ Return the :class:`Plan` of *operator* on *pool*. """
+    rvs = pool.drvs
+    costs = col.OrderedDict()
+    for kernel, cost in _COSTS.items():
+        estimate = cost(operator, rvs)
+        if estimate is not None:
+            costs[kernel] = estimate
+
+    fits = [(t, kernel) for kernel, (t, m) in costs.items()
+            if (latency_budget is None or t <= latency_budget) and
+            (memory_cap is None or m <= memory_cap)]
+    others = ", ".join("{} {}".format(k, _fmt(*c)) for k, c in costs.items())
+    if fits:
+        _, kernel = min(fits)
+        t, m = costs[kernel]
+        reason = "cheapest exact kernel within budget ({})".format(others)
+        return Plan(kernel, t, m, reason)
+
+    if monte_carlo_samples:
+        samples = _monte_carlo_samples(operator, rvs)
+        t = samples * len(rvs) / RATES['monte_carlo']
+        reason = ("no exact kernel within budget ({}); estimated from {} "
+                  "samples".format(others, samples))
+        return Plan('monte_carlo', t, 16 * samples * len(rvs), reason)
+
+    raise ValueError("No kernel fits the budget ({}).".format(others))
+
+
+def execute(operator, pool, name):
+    """ Return the result of *operator* on *pool*, named *name*, computed by
+    the kernel chosen by :func:`plan`; the plan is the ``plan`` attribute of
+    the result.
+
+    Reductions of unknown kinds are computed pairwise, however large their
+    pools are:
+
+    >>> d20 = drv.core.DiscreteRandomVariable('d20', xs=range(1, 21),
+    ...                                       ps=[0.05] * 20)
+    >>> high = drv.core.ReduceOperator(lambda a, b: max(a, b), unpack=True)
+    >>> res = execute(high, drv.core.RandomVariablePool(*12 * [d20]), 'high')
+    >>> res.plan.kernel, res.min, res.max
+    ('sparse', 1, 20)
+    """
+    if not pool or operator.joint or not all(
+            isinstance(rv, drv.core.DiscreteRandomVariable)
+            for rv in pool.drvs):
+        return operator._operate(pool, name)
+
+    chosen = plan(operator, pool)
+    drv.instrument.note(kernel=chosen.kernel)
+    if chosen.kernel in ('sparse', 'product'):
+        ## These format the name themselves
+        res = _KERNELS[chosen.kernel](operator, pool, name)
+    elif chosen.kernel == 'monte_carlo':
+        samples = _monte_carlo_samples(operator, pool.drvs)
+        res = _monte_carlo(operator, pool, name, samples)
+    else:
+        res = _KERNELS[chosen.kernel](operator, pool, _format(name, pool))
+    res.plan = chosen
+    return res
@@ -2,80 +2,148 @@
 .. plot_tools.py
 
 This module provides plotting facilities for the discrete random variables.
+Matplotlib is imported only when plotting, as importing it is slow.
+
+Figures are drawn through their own axes (rather than through pyplot's
+current figure), so that they may also be drawn headless: :func:`render`
+draws many figures with the Agg backend, without pyplot, and saves them to
+files, in a pool of processes::
+
+    render({'attack-{}-{}.png'.format(a, d): attack(a, d)
+            for a in (1, 2, 3) for d in (1, 2)}, method='pmf')
 """
 
+## Math
+import numpy as np
+
 ## Tools
 import functools as fn
+import multiprocessing as mp
 import textwrap as tw
 
-## Plot library
-import matplotlib.pyplot as plt
-
 
 #######################
 ## ----- Utils ----- ##
 #######################
 
-def _y_of_path(xs, ys, x, n=100):
-    """ Find the ``y`` coordinate of *line* in a given *x*. Do it as to
-    precision *n*. """
-    prev_a = prev_b = None
-    for a, b in zip(xs, ys):
-        if a > x:
-            break
-        prev_a, prev_b = a, b
-    if None in (prev_a, prev_b):
+def _y_of_path(xs, ys, x):
+    """ Find the ``y`` coordinate of the path through *xs* and *ys* (where
+    *xs* are increasing) in a given *x*, or None if *x* is out of the path's
+    range. """
+    if not len(xs) or not xs[0] <= x <= xs[-1]:
         return None
-    slope = (b - prev_b) / (a - prev_a)
-    return prev_b + slope * (x - prev_a)
+    return float(np.interp(x, xs, ys))
+
+
+def _method_name(method):
+    """ Return the name of *method*, which is either a method of a random
+    variable or its name. """
+    return method if isinstance(method, str) else method.__name__
+
+
+def _graph(drv, method):
+    """ Return the graph of *method* of *drv*; *method* is evaluated once, on
+    the whole range of *drv* (see :meth:`graph`). """
+    if isinstance(method, str):
+        method = getattr(drv, method)
+    return drv.graph(method)
 
 
 ########################################
 ## ----- General Plot Functions ----- ##
 ########################################
 
-def _plot_axes(xlabel=None, ylabel=None, title=None, figsize=None, dpi=None):
-    fig = plt.figure(figsize=figsize, dpi=dpi)
+def _figure(headless=False, figsize=None, dpi=None):
+    """ Return a new figure; a pyplot figure, or, if *headless*, a figure
+    which is drawn by the Agg backend (and which pyplot does not know). """
+    if not headless:
+        import matplotlib.pyplot as plt
+        return plt.figure(figsize=figsize, dpi=dpi)
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _plot_axes(xlabel=None, ylabel=None, title=None, figsize=None, dpi=None,
+               headless=False):
+    fig = _figure(headless=headless, figsize=figsize, dpi=dpi)
     ax = fig.add_axes((0.1, 0.2, 0.8, 0.7))
     if xlabel:
-        plt.xlabel(xlabel)
+        ax.set_xlabel(xlabel)
     if ylabel:
-        plt.ylabel(ylabel)
+        ax.set_ylabel(ylabel)
     if title:
-        plt.title(title)
+        ax.set_title(title)
 
     return fig, ax
 
 
+def _xkcd_params():
+    """ Return the rc parameters of the xkcd style (those which
+    ``pyplot.xkcd`` sets), without importing pyplot. """
+    from matplotlib import patheffects
+    return {
+        'font.family': ['xkcd', 'Humor Sans', 'Comic Sans MS'],
+        'font.size': 14.0,
+        'path.sketch': (1, 100, 2),
+        'path.effects': [patheffects.withStroke(linewidth=4,
+                                                foreground='w')],
+        'axes.linewidth': 1.5,
+        'lines.linewidth': 2.0,
+        'figure.facecolor': 'white',
+        'grid.linewidth': 0.0,
+        'axes.grid': False,
+        'axes.unicode_minus': False,
+        'axes.edgecolor': 'black',
+        'xtick.major.size': 8,
+        'xtick.major.width': 3,
+        'ytick.major.size': 8,
+        'ytick.major.width': 3,
+    }
+
+
 def _plot_xkcd(plot_func, *args, **kwargs):
-    """ Plot with *plot_func*, *args* and **kwargs*, but in xkcd style. """
-    with plt.xkcd():
+    """ Plot with *plot_func*, *args* and **kwargs*, but in xkcd style; pyplot
+    is not imported, so headless figures may be in xkcd style as well. """
+    import matplotlib
+    with matplotlib.rc_context(_xkcd_params()):
         fig = plot_func(*args, **kwargs)
     return fig
 
 
-def _plot_graph(plot_func, drv, method, mean=False, std=False, filename=None,
-                xkcd=False, **kwargs):
-    x, y = drv.graph(method)
+def _plot_graph(plot_func, drvs, method, mean=False, std=False, filename=None,
+                xkcd=False, headless=False, **kwargs):
+    """ Plot the graphs of *method* of *drvs* (a random variable, or a list of
+    random variables which are overlaid) with *plot_func*; the mean and the
+    standard deviation are annotated only for a single random variable. """
+    if not isinstance(drvs, list):
+        drvs = [drvs]
+    graphs = [_graph(drv, method) for drv in drvs]
 
     xlabel = 'RESULT'
     ylabel = 'PROBABILITY'
-    title = "{name} ({meth})".format(name=drv.name,
-                                     meth=method.im_func.func_name)
-    kwargs.update(xlabel=xlabel, ylabel=ylabel, title=title)
+    title = "{name} ({meth})".format(
+        name=", ".join(drv.name for drv in drvs), meth=_method_name(method))
+    kwargs.update(xlabel=xlabel, ylabel=ylabel, title=title,
+                  headless=headless)
+    if len(drvs) > 1:
+        kwargs['labels'] = [drv.name for drv in drvs]
 
     ## Mask
-    kwargs['mask'] = getattr(drv, 'mask', None)
+    kwargs['mask'] = getattr(drvs[0], 'mask', None)
 
-    if mean:
-        kwargs['mean'] = drv.mean
-    if std:
-        kwargs['std'] = drv.std
+    if len(drvs) == 1 and mean:
+        kwargs['mean'] = drvs[0].mean
+    if len(drvs) == 1 and std:
+        kwargs['std'] = drvs[0].std
 
     ## Make figure
     if xkcd:
         plot_func = fn.partial(_plot_xkcd, plot_func)
-    fig = plot_func(x, y, **kwargs)
+    fig = plot_func(graphs, **kwargs)
 
     ## Show
     if not filename:
@@ -92,73 +160,86 @@ def _format_tick(mask, tick):
     return "\n".join(tw.wrap(mask.get(tick, ''), width=10))
 
 
+def _limits(graphs):
+    """ Return the limits (xmin, xmax, ymin, ymax) of *graphs*. """
+    xs = np.concatenate([np.asarray(x, dtype=float) for x, _ in graphs])
+    ys = np.concatenate([np.asarray(y, dtype=float) for _, y in graphs])
+    return xs.min(), xs.max(), ys.min(), ys.max()
+
+
 ######################################
 ## ----- Curve Plot Functions ----- ##
 ######################################
 
-def _plot_curve_mean(x, y, mean):
+def _plot_curve_mean(ax, x, y, mean):
     mean_y = _y_of_path(x, y, mean)
     if mean_y is None:
         return
 
     dy = max(y) - min(y)
     xy_mean_text = mean, max(y) + dy * 0.2
-    plt.annotate("Mean", xy=(mean, mean_y), xytext=xy_mean_text,
-                 arrowprops=dict(arrowstyle='->', facecolor='green'),
-                 color='green')
+    ax.annotate("Mean", xy=(mean, mean_y), xytext=xy_mean_text,
+                arrowprops=dict(arrowstyle='->', facecolor='green'),
+                color='green')
 
 
-def _plot_curve_std(x, y, mean, std):
+def _plot_curve_std(ax, x, y, mean, std):
     left_x = mean - std
     left_y = _y_of_path(x, y, left_x)
     if left_y is None:
         return
     ymin = min(y)
-    plt.plot([left_x, left_x], [ymin, left_y], color='red')
+    ax.plot([left_x, left_x], [ymin, left_y], color='red')
     right_x = mean + std
     right_y = _y_of_path(x, y, right_x)
     if right_y is None:
         return
-    plt.plot([right_x, right_x], [ymin, right_y], color='red')
+    ax.plot([right_x, right_x], [ymin, right_y], color='red')
 
     mid_y = min(left_y - ymin, right_y - ymin) * 0.5 + ymin
     xy_std_text = mean, mid_y
-    plt.annotate("STD", xy=(right_x, mid_y), xytext=xy_std_text,
-                 arrowprops=dict(arrowstyle='->'), color='purple')
+    ax.annotate("STD", xy=(right_x, mid_y), xytext=xy_std_text,
+                arrowprops=dict(arrowstyle='->'), color='purple')
 
 
-def _plot_curve(x, y, mean=None, std=None, mask=None, **kwargs):
+def _plot_curve(graphs, mean=None, std=None, mask=None, labels=None,
+                **kwargs):
     ## Set figure and axes
     fig, ax = _plot_axes(**kwargs)
 
-    ## Plot the curve itself
-    plt.plot(x, y)
+    ## Plot the curves themselves
+    for i, (x, y) in enumerate(graphs):
+        ax.plot(x, y, label=labels[i] if labels else None)
+    if labels:
+        ax.legend()
 
     ## Point to mean
+    x, y = graphs[0]
     if mean is not None:
-        _plot_curve_mean(x, y, mean)
+        _plot_curve_mean(ax, x, y, mean)
 
     ## Set x and y limits
-    ax.set_xlim(min(x), max(x))
-    dy = max(y) - min(y)
-    ymin = min(y)
+    xmin, xmax, ymin, ymax = _limits(graphs)
+    ax.set_xlim(xmin, xmax)
+    dy = ymax - ymin
     if mean:
-        ymax = max(y) + dy * 0.3
+        ymax += dy * 0.3
     else:
-        ymax = max(y) + dy * 0.1
+        ymax += dy * 0.1
     ax.set_ylim(ymin, ymax)
 
     ## Show standard deviation
     if mean and std:
-        _plot_curve_std(x, y, mean, std)
+        _plot_curve_std(ax, x, y, mean, std)
 
     return fig
 
 
 def plot_curve(drv, method, mean=False, std=False, **kwargs):
     """ Plot a curve which contains the data returned by *method* which
-    correspond to *drv*. If *mean*, annotate the mean. If *std*, in addition,
-    annotate the standard deviation.
+    correspond to *drv* (or curves, if *drv* is a list of random variables).
+    If *mean*, annotate the mean. If *std*, in addition, annotate the standard
+    deviation.
 
     This function accepts any plot-related kwargs.
     """
@@ -169,15 +250,22 @@ def plot_curve(drv, method, mean=False, std=False, **kwargs):
 ## ----- Bars Plot Functions ----- ##
 #####################################
 
-def _plot_bars(x, y, mask=None, **kwargs):
+def _plot_bars(graphs, mask=None, labels=None, **kwargs):
     ## Set figure and axes
     fig, ax = _plot_axes(**kwargs)
 
     ## Set x limits
-    ax.set_xlim(min(x), max(x))
-
-    ## Plot the curve itself
-    plt.bar(x, y, align='center')
+    xmin, xmax, _, _ = _limits(graphs)
+    ax.set_xlim(xmin, xmax)
+
+    ## Plot the bars themselves; overlaid graphs are side by side
+    width = 0.8 / len(graphs)
+    for i, (x, y) in enumerate(graphs):
+        shift = (i - (len(graphs) - 1) / 2.) * width
+        ax.bar(np.asarray(x) + shift, y, width=width, align='center',
+               label=labels[i] if labels else None)
+    if labels:
+        ax.legend()
 
     ## Tick labels (mask)
     if mask:
@@ -190,10 +278,73 @@ def _plot_bars(x, y, mask=None, **kwargs):
 
 def plot_bars(drv, method, **kwargs):
     """ Plot a bar plot which contains the data returned by *method* which
-    correspond to *drv*. If *mean*, annotate the mean. If *std*, in addition,
-    annotate the standard deviation.
+    correspond to *drv* (or bars side by side, if *drv* is a list of random
+    variables). If *mean*, annotate the mean. If *std*, in addition, annotate
+    the standard deviation.
 
     This function accepts any plot-related kwargs.
     """
     return _plot_graph(_plot_bars, drv, method, **kwargs)
 
+
+#################################
+## ----- Batch Rendering ----- ##
+#################################
+
+_PLOTS = {
+    'curve': plot_curve,
+    'bars': plot_bars,
+}
+
+
+def _render(job):
+    """ Render the figure of *job*, a tuple (filename, random variables,
+    method name, kind, kwargs), to its file; return the filename. """
+    filename, drvs, method, kind, kwargs = job
+    _PLOTS[kind](drvs, method, filename=filename, headless=True, **kwargs)
+    return filename
+
+
+def _figures(figures):
+    """ Return the list of pairs (filename, random variables) of *figures*,
+    which is either a mapping from filenames to random variables, or a
+    sequence of such pairs. """
+    if hasattr(figures, 'items'):
+        return sorted(figures.items())
+    try:
+        return [(filename, drvs) for filename, drvs in figures]
+    except (TypeError, ValueError):
+        raise ValueError("Expected a mapping from filenames to random "
+                         "variables, or (filename, random variables) pairs.")
+
+
+def render(figures, method='pmf', kind='bars', processes=None, **kwargs):
+    """ Render *figures*, a mapping from filenames to random variables (or to
+    lists of random variables, which are overlaid in a single figure), or a
+    sequence of (filename, random variables) pairs, to their files, and return
+    the list of filenames.
+
+    *method* is the name of the method of the random variables which is
+    plotted, and *kind* is either 'bars' or 'curve'. The figures are headless
+    (they are drawn by the Agg backend), and are rendered in a pool of
+    *processes* processes (by default, as many as there are CPUs); if
+    *processes* is 1, they are rendered in this process.
+
+    This function accepts any plot-related kwargs, which apply to all
+    figures.
+    """
+    if kind not in _PLOTS:
+        raise ValueError("Unknown plot kind {}.".format(kind))
+    jobs = [(filename, drvs, method, kind, kwargs)
+            for filename, drvs in _figures(figures)]
+    if processes == 1 or len(jobs) < 2:
+        return [_render(job) for job in jobs]
+
+    processes = processes or mp.cpu_count()
+    pool = mp.Pool(processes)
+    try:
+        chunksize = max(len(jobs) // (4 * processes), 1)
+        return pool.map(_render, jobs, chunksize=chunksize)
+    finally:
+        pool.close()
+        pool.join()
@@ -7,13 +7,21 @@ mechanics.
 """
 
 ## Framework
+import drv.core
 import drv.dice.base
+import drv.lazy
 
 ## Sugar
 dk = drv.dice.base.dk
 
 
 ## This dice is used, according to Wikipedia, in Necromunda and Mordheim
-d10x = dk(10) * dk(10)
-d10x.name = 'd10x'
+@drv.core.memoize
+def _d10x():
+    die = dk(10) * dk(10)
+    die.name = 'd10x'
+    return die
+
+
+drv.lazy.attributes(__name__, {'d10x': _d10x})
 
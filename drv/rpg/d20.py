@@ -3,10 +3,10 @@
 """
 
 ## Framework
-import drv.game.base
+import drv.dice.base
 
 ## Sugar
-dk = drv.game.base.dk
+dk = drv.dice.base.dk
 
 
 def test(skill, target):
@@ -5,6 +5,7 @@
 ## Framework
 import drv.core
 import drv.dice.base
+import drv.lazy
 
 ## Sugar
 POOL = drv.core.RandomVariablePool
@@ -12,15 +13,20 @@ dk = drv.dice.base.dk
 
 
 ## Fudge dice notation is according to Wikipedia
-fudge_die = dk(3) - 2
-fudge_die.name = 'dF'
+@drv.core.memoize
+def _fudge_die():
+    die = dk(3) - 2
+    die.name = 'dF'
+    return die
 
 
 def test(skill, target):
     """ Return a random variable which rolls 4 fudge die, adds it to *skill*,
     and checks whether it is at least *target*. """
-    fudge_sum = POOL(*([fudge_die] * 4)).sum('4dF')
+    fudge_sum = POOL(*([_fudge_die()] * 4)).sum('4dF')
     tst = (fudge_sum + skill) >= target
     tst.mask = {1: 'Success', 0: 'Failure'}
     return tst
 
+
+drv.lazy.attributes(__name__, {'fudge_die': _fudge_die})
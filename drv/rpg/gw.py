@@ -6,15 +6,20 @@ provides some of its dice mechanics.
 """
 
 ## Framework
-import drv.game.base
+import drv.core
+import drv.dice.base
+import drv.lazy
 
 ## Sugar
-dk = drv.game.base.dk
+dk = drv.dice.base.dk
 
 
 ## This dice is used, according to Wikipedia, in Necromunda and Mordheim
-d66 = dk(6) * 10 + dk(6)
-d66.name = 'D66'
+@drv.core.memoize
+def _d66():
+    die = dk(6) * 10 + dk(6)
+    die.name = 'D66'
+    return die
 
 
 ## This is introduced, according to Wikipedia, in Blood Bowl
@@ -24,3 +29,5 @@ def db(x):
     ## -2 or -3.
     raise NotImplementedError
 
+
+drv.lazy.attributes(__name__, {'d66': _d66})
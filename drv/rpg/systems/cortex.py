@@ -4,10 +4,11 @@
 
 from drv.dice.base import dk
 
+import drv.lazy
 
-d2 = dk(2)
-d4 = dk(4)
-d6 = dk(6)
-d8 = dk(8)
-d10 = dk(10)
-d12 = dk(12)
+## Python basics
+import functools as fn
+
+
+drv.lazy.attributes(__name__, dict(('d{}'.format(k), fn.partial(dk, k))
+                                   for k in [2, 4, 6, 8, 10, 12]))
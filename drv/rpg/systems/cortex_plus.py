@@ -7,8 +7,14 @@ result of a roll is always the sum of the two highest results.  Results of 1 do
 not count, but instead are 0 (and in fact cause complications).  """
 
 
-from drv.core import RandomVariablePool as POOL
+from drv.core import memoize
 from drv.dice.base import custom_die
+from drv.joint import JointDiscreteRandomVariable
+
+import drv.lazy
+
+import collections as col
+import functools as fn
 
 
 def dk(k):
@@ -16,13 +22,103 @@ def dk(k):
     return custom_die([0] + range(2, k + 1), name)
 
 
-d4 = dk(4)
-d6 = dk(6)
-d8 = dk(8)
-d10 = dk(10)
-d12 = dk(12)
+## The full mechanic: the total is the sum of the two highest results, and the
+## effect die is the largest die which may be left out of the total without
+## lowering it (or a d4, if there is none); 1s count neither for the total nor
+## as the effect die, but are complications.
+##
+## The pool is solved by a dynamic programming over its dice, sorted from the
+## largest to the smallest, whose state is:
+## - the (up to) three highest results which are not 1;
+## - a "staircase" of (die size, lowest result which is not 1) pairs, keeping a
+##   size only if its lowest result is lower than those of all larger sizes;
+## - the number of 1s.
+## The largest size whose lowest result is at most the third highest result
+## is then the effect die. Since the third highest result never decreases, the
+## staircase is cut after its first such size.
+
+DEFAULT_EFFECT = 4
+
+
+@memoize
+def _pool_states(dice):
+    """ Return a dictionary from the states of the (descending) tuple *dice*
+    to their probabilities; prefixes are cached, so similar pools share their
+    computations. """
+    if not dice:
+        return {((), (), 0): 1.0}
+
+    k = dice[-1]
+    p = 1. / k
+    states = col.defaultdict(float)
+    for (top, stair, ones), q in _pool_states(dice[:-1]).iteritems():
+        states[top, stair, ones + 1] += p * q
+        for v in xrange(2, k + 1):
+            _top = tuple(sorted(top + (v,), reverse=True)[:3])
+            third = _third(_top)
+            if stair and stair[-1][0] == k:
+                _stair = stair[:-1] + ((k, min(v, stair[-1][1])),)
+            elif not stair or third < stair[-1][1] > v:
+                _stair = stair + ((k, v),)
+            else:
+                _stair = stair
+            _stair = tuple(_cut(_stair, third))
+            states[_top, _stair, ones] += p * q
+    return states
+
+
+def _third(top):
+    """ Return the third highest result, or 0 if there is none. """
+    return top[2] if len(top) == 3 else 0
+
+
+def _cut(stair, third):
+    """ Generate the staircase up to its first size which may be the effect
+    die. """
+    for k, low in stair:
+        yield k, low
+        if low <= third:
+            return
+
+
+def _outcome(top, stair, ones):
+    """ Return the (total, effect die, complications) of a final state. """
+    third = _third(top)
+    effect = next((k for k, low in stair if low <= third), DEFAULT_EFFECT)
+    return sum(top[:2]), effect, ones
+
+
+@memoize
+def _solve(dice):
+    """ Return the solution of the (descending) tuple *dice*. """
+    outcomes = col.defaultdict(float)
+    for state, p in _pool_states(dice).iteritems():
+        outcomes[_outcome(*state)] += p
+    xs, ps = zip(*outcomes.items())
+    name = ",".join("d{}".format(k) for k in dice)
+    return JointDiscreteRandomVariable(name, xs=xs, ps=ps)
+
+
+def solve(*dice):
+    """ Return the joint random variable of the total, the size of the effect
+    die and the number of complications of rolling a pool of *dice* (given by
+    their sizes). Results are cached by the pool's multiset of sizes. """
+    return _solve(tuple(sorted(dice, reverse=True)))
 
 
 def roll_and_keep(*dice):
-    pool = POOL(*(dk(k) for k in dice))
-    return pool.nlargest_sum(2, ",".join("d{}".format(k) for k in dice))
+    """ Return the random variable of the total (the sum of the two highest
+    results) of a pool. """
+    name = ",".join("d{}".format(k) for k in dice)
+    return solve(*dice).marginal(0, name=name)
+
+
+def roll_with_complications(*dice):
+    """ Return the joint random variable of the total (as in
+    :func:`roll_and_keep`) and the number of complications (1s) of a pool. """
+    name = ",".join("d{}".format(k) for k in dice)
+    return solve(*dice).marginal((0, 2), name=name)
+
+
+drv.lazy.attributes(__name__, dict(('d{}'.format(k), fn.partial(dk, k))
+                                   for k in [4, 6, 8, 10, 12]))
@@ -6,13 +6,31 @@ D6 System: a universal RPG system published by West End Games in 1996.
 https://en.wikipedia.org/wiki/D6_System
 """
 
-from drv.dice import d6, ndk
+import drv.dice
+import drv.lazy
+from drv.core import memoize
+from drv.dice import ndk
+from drv.dice.base import compounding_dk
 
 
-def ndp(n, p):
-    s = ndk(n, 6) + p
+## The wild die is rolled again, and added, on a 6
+@memoize
+def _wild_die():
+    return compounding_dk(6, name='W')
+
+
+def ndp(n, p, wild=False):
+    """ Return the random variable of rolling *n* dice and adding *p*; if
+    *wild*, one of the dice is the wild die. """
+    if wild:
+        s = _wild_die() + p
+        if n > 1:
+            s = ndk(n - 1, 6) + s
+    else:
+        s = ndk(n, 6) + p
     s.name = "{n}D+{p}".format(n=n, p=p)
     return s
 
 
-## TODO: Wild die
+drv.lazy.attributes(__name__, {'d6': lambda: drv.dice.d6,
+                               'wild_die': _wild_die})
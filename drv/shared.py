@@ -0,0 +1,143 @@
+"""
+.. shared.py
+
+Transport of random variables to worker processes through shared memory.
+
+:func:`publish` copies the values and probabilities of random variables into a
+single block of shared memory, once. The returned :class:`SharedLibrary` is
+pickled as the name of the block (and the names of the random variables), so
+sending it to workers is cheap, and workers attach to the block without
+copying it; the random variables a worker gets are views of the block.
+
+Random variables which are pickled on their own are pickled as their arrays
+only (see :meth:`drv.core.DiscreteRandomVariable.__getstate__`).
+
+Shared memory is :mod:`multiprocessing.shared_memory` where it is available,
+and a memory-mapped file in ``/dev/shm`` otherwise. A process keeps every
+block it has published or attached to mapped until it exits; the publisher
+should :meth:`~SharedLibrary.unlink` a block once no more workers will attach
+to it.
+"""
+
+## Framework
+import drv.storage
+
+## Math
+import numpy as np
+
+## Memory
+import mmap
+import os
+import tempfile
+import uuid
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+## The directory of memory-mapped blocks, where shared_memory is unavailable
+_SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+## The blocks mapped by this process, by name
+_blocks = {}
+
+
+class _Block(object):
+    """ A named block of shared memory of *size* bytes, which is created if
+    *create*, and attached to (read-only, where possible) otherwise. """
+    def __init__(self, name, size, create=False):
+        self.name = name
+        self.size = size
+        if shared_memory is not None:
+            self._shm = _shared_memory(name, size, create)
+            self.buf = self._shm.buf
+            return
+
+        self._shm = None
+        path = os.path.join(_SHM_DIR, name)
+        if create:
+            with open(path, 'wb') as f:
+                f.truncate(size)
+        with open(path, 'r+b' if create else 'rb') as f:
+            access = mmap.ACCESS_WRITE if create else mmap.ACCESS_READ
+            self.buf = mmap.mmap(f.fileno(), size, access=access)
+
+    def unlink(self):
+        """ Remove the name of the block; the memory is freed once every
+        process which mapped it exits. """
+        if self._shm is not None:
+            self._shm.unlink()
+        else:
+            os.remove(os.path.join(_SHM_DIR, self.name))
+
+
+def _shared_memory(name, size, create):
+    """ Return a :class:`multiprocessing.shared_memory.SharedMemory`; attached
+    blocks are not tracked, so that they outlive the attaching process. """
+    if create:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _arrays(block, n_drvs, n_values):
+    """ Return the arrays (xs, ps, offsets) laid out in *block*. """
+    offsets = np.ndarray(n_drvs + 1, dtype=np.int64, buffer=block.buf)
+    start = offsets.nbytes
+    xs = np.ndarray(n_values, dtype=np.int64, buffer=block.buf, offset=start)
+    ps = np.ndarray(n_values, dtype=float, buffer=block.buf,
+                    offset=start + xs.nbytes)
+    return xs, ps, offsets
+
+
+class SharedLibrary(drv.storage.DistributionLibrary):
+    """ A :class:`drv.storage.DistributionLibrary` whose arrays are in shared
+    memory; it is pickled as a reference to its block. """
+    def __init__(self, block, n_drvs, n_values, index):
+        xs, ps, offsets = _arrays(block, n_drvs, n_values)
+        super(SharedLibrary, self).__init__(xs, ps, offsets, index)
+        self._block = block
+
+    def __reduce__(self):
+        return _attach, (self._block.name, self._block.size, len(self),
+                         len(self.xs), self._index)
+
+    def unlink(self):
+        """ Remove the shared block; processes which have already attached to
+        it may still use it. """
+        self._block.unlink()
+
+
+def _attach(name, size, n_drvs, n_values, index):
+    """ Return the :class:`SharedLibrary` of the block *name*; a process
+    attaches to each block only once. """
+    if name not in _blocks:
+        _blocks[name] = _Block(name, size)
+    return SharedLibrary(_blocks[name], n_drvs, n_values, index)
+
+
+def publish(drvs):
+    """ Copy *drvs* (a random variable, or a sequence or a mapping of them)
+    into shared memory, and return their :class:`SharedLibrary`. """
+    items = drv.storage._items(drvs)
+    lengths = [len(rv.xs) for _, rv in items]
+    n_values = sum(lengths)
+    size = max(8 * (len(items) + 1 + 2 * n_values), 1)
+
+    name = 'drv-{}'.format(uuid.uuid4().hex[:24])
+    block = _Block(name, size, create=True)
+    _blocks[name] = block
+
+    xs, ps, offsets = _arrays(block, len(items), n_values)
+    offsets[0] = 0
+    np.cumsum(lengths, out=offsets[1:])
+    for (_, rv), start, end in zip(items, offsets[:-1], offsets[1:]):
+        xs[start:end] = rv.xs
+        ps[start:end] = rv.ps
+
+    index = drv.storage._index(items)
+    return SharedLibrary(block, len(items), n_values, index)
@@ -0,0 +1,87 @@
+"""
+.. stopping.py
+
+Stopping times of repeated rolls; for example, the number of rounds until the
+cumulative damage reaches the target's hit points, or the number of rounds
+until the first success.
+"""
+
+## Framework
+import drv.core
+
+## Math
+import numpy as np
+
+## Sugar
+DRV = drv.core.DiscreteRandomVariable
+
+
+def _step_array(rv, top):
+    """ Return the probabilities of a single round of *rv* as a dense array
+    indexed by value, where all values of at least *top* are lumped at index
+    *top*; the array is only as long as the support of *rv* requires. """
+    xs = np.asarray(rv.xs, dtype=int)
+    if (xs < 0).any():
+        raise ValueError("Per-round values should be non-negative.")
+    step = np.zeros(min(xs.max(), top) + 1)
+    np.add.at(step, np.minimum(xs, top), rv.ps)
+    return step
+
+
+def first_passage(rv, threshold, tol=1e-12, max_rounds=None, name=None):
+    """ Return the random variable of the number of rounds until the
+    cumulative sum of independent rolls of *rv* is at least *threshold*. The
+    values of *rv* must be non-negative integers.
+
+    *threshold* may also be a sequence of thresholds, in which case a list of
+    random variables is returned; all thresholds are computed in a single
+    pass.
+
+    The computation keeps only the mass which has not been absorbed yet, and
+    stops once it is at most *tol*; this remaining mass is discarded. If more
+    than *tol* remains after *max_rounds* rounds, a ValueError is raised.
+    """
+    scalar = np.isscalar(threshold)
+    ts = np.atleast_1d(np.asarray(threshold, dtype=int))
+    if (ts < 1).any():
+        raise ValueError("Thresholds should be positive.")
+    top = ts.max()
+
+    step = _step_array(rv, top)
+    if step[0] >= 1.0:
+        raise ValueError("The cumulative sum never increases.")
+
+    ## Mass of the cumulative sums which are still below the top threshold,
+    ## and the probability to still be below each threshold
+    alive = np.zeros(top)
+    alive[0] = 1.0
+    survival = np.ones(len(ts))
+
+    pmfs = []
+    rounds = 0
+    while survival.max() > tol:
+        if max_rounds is not None and rounds >= max_rounds:
+            break
+        rounds += 1
+        alive = np.convolve(alive, step)[:top]
+        new_survival = alive.cumsum()[ts - 1]
+        pmfs.append(survival - new_survival)
+        survival = new_survival
+
+    if survival.max() > tol:
+        raise ValueError("After {} rounds, the threshold is not reached with "
+                         "probability {:.3g}.".format(rounds, survival.max()))
+
+    xs = np.arange(1, rounds + 1)
+    pmfs = np.array(pmfs).reshape(rounds, len(ts))
+    _name = name or "Rounds until {rv.name} reaches {t}"
+
+    res = []
+    for t, ps in zip(ts, pmfs.T):
+        ## Remove rounding noise around zero
+        res.append(DRV(_name.format(rv=rv, t=t), xs=xs,
+                       ps=np.maximum(ps, 0)))
+
+    if scalar:
+        return res[0]
+    return res
@@ -0,0 +1,136 @@
+"""
+.. storage.py
+
+A compact binary format for libraries of random variables, which may be
+loaded by memory-mapping, so that loading is (almost) free and the data is
+shared by all processes which load the same library.
+
+A library is a directory which contains:
+
+- ``xs.npy`` and ``ps.npy`` -- the concatenated values and probabilities of
+  all random variables;
+- ``offsets.npy`` -- the start of each random variable in these arrays (with a
+  final entry which is the total length);
+- ``index.json`` -- the keys, names and masks of the random variables.
+"""
+
+## Framework
+import drv.core
+import drv.table
+
+## Math
+import numpy as np
+
+## Data containers
+import collections as col
+
+## Files
+import json
+import os
+
+
+def _items(drvs):
+    """ Return a list of (key, random variable) pairs of *drvs*, which may be
+    a single random variable, a sequence or a mapping of them. """
+    if isinstance(drvs, drv.core.BaseDiscreteRandomVariable):
+        return [(0, drvs)]
+    if isinstance(drvs, col.Mapping):
+        return sorted(drvs.items())
+    return list(enumerate(drvs))
+
+
+def _json_key(key):
+    """ Return *key* as a JSON-able object; tuples become lists. """
+    if isinstance(key, tuple):
+        return [_json_key(k) for k in key]
+    return key
+
+
+def _py_key(key):
+    """ Return the original key of a JSON-decoded *key*. """
+    if isinstance(key, list):
+        return tuple(_py_key(k) for k in key)
+    return key
+
+
+def _index(items):
+    """ Return the index of *items*; the keys, names and masks of their random
+    variables. """
+    index = []
+    for key, rv in items:
+        mask = getattr(rv, 'mask', None)
+        if mask is not None:
+            mask = sorted(mask.items())
+        index.append({'key': _json_key(key), 'name': rv.name, 'mask': mask})
+    return index
+
+
+def save(drvs, path):
+    """ Save *drvs* (a random variable, or a sequence or a mapping of them,
+    whose keys are strings, numbers or tuples of these) as a library in the
+    directory *path*. """
+    items = _items(drvs)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    table = drv.table.from_drvs(rv for _, rv in items)
+    np.save(os.path.join(path, 'xs.npy'), table.xs)
+    np.save(os.path.join(path, 'ps.npy'), table.ps)
+    np.save(os.path.join(path, 'offsets.npy'), table.offsets)
+
+    with open(os.path.join(path, 'index.json'), 'w') as f:
+        json.dump(_index(items), f)
+
+
+class DistributionLibrary(col.Mapping):
+    """ A read-only mapping from keys to random variables, backed by (memory
+    mapped) concatenated arrays. Random variables are materialized only when
+    accessed, as views of these arrays; ``table`` is the
+    :class:`drv.table.DistributionTable` of all of them, in the order of the
+    keys. """
+    def __init__(self, xs, ps, offsets, index):
+        self.table = drv.table.DistributionTable(
+            xs, ps, offsets, [entry['name'] for entry in index])
+        self._index = index
+        self._positions = dict((_py_key(entry['key']), i)
+                               for i, entry in enumerate(index))
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return (_py_key(entry['key']) for entry in self._index)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __getitem__(self, key):
+        i = self._positions[key]
+        rv = self.table[i]
+        mask = self._index[i]['mask']
+        if mask is not None:
+            rv.mask = dict(mask)
+        return rv
+
+    @property
+    def xs(self):
+        return self.table.xs
+
+    @property
+    def ps(self):
+        return self.table.ps
+
+    @property
+    def offsets(self):
+        return self.table.offsets
+
+
+def load(path, mmap=True):
+    """ Return the :class:`DistributionLibrary` saved in the directory *path*;
+    if *mmap*, the arrays are memory-mapped rather than read. """
+    mode = 'r' if mmap else None
+    arrays = [np.load(os.path.join(path, name), mmap_mode=mode)
+              for name in ('xs.npy', 'ps.npy', 'offsets.npy')]
+    with open(os.path.join(path, 'index.json')) as f:
+        index = json.load(f)
+    return DistributionLibrary(*(arrays + [index]))
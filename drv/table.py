@@ -0,0 +1,155 @@
+"""
+.. table.py
+
+A table of many random variables, stored as concatenated arrays of values and
+probabilities (like a CSR matrix, whose rows are the random variables), rather
+than as separate objects, each with its own arrays (and SciPy object).
+
+Statistics of a :class:`DistributionTable` are computed for all rows at once,
+by a few NumPy calls, and every row is a normal random variable::
+
+    table = drv.table.from_drvs([attack(a, d) for a, d in pairs])
+    table.mean
+    table.sf(0)
+    table[3].pmf(2)
+"""
+
+## Framework
+import drv.core
+
+## Math
+import numpy as np
+
+
+class DistributionTable(object):
+    """ A ``DistributionTable`` is a sequence of random variables, whose values
+    and probabilities are the concatenated arrays *xs* and *ps*; the values of
+    the *i*'th random variable are ``xs[offsets[i]:offsets[i+1]]``. *names*
+    are the names of the random variables (they are nameless if it is None).
+    """
+    def __init__(self, xs, ps, offsets, names=None):
+        self.xs = xs
+        self.ps = ps
+        self.offsets = offsets
+        self.names = names
+        self._rows = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        return (self[i] for i in xrange(len(self)))
+
+    def __getitem__(self, i):
+        """ Return the *i*'th random variable; its arrays are views of the
+        table's arrays. """
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Table index out of range.")
+        start, end = self.offsets[i], self.offsets[i + 1]
+        name = self.names[i] if self.names is not None else ''
+        return drv.core._from_arrays(name, self.xs[start:end],
+                                     self.ps[start:end])
+
+    ## ----- Helpers ----- ##
+
+    @property
+    def lengths(self):
+        """ The support sizes of the random variables. """
+        return np.diff(self.offsets)
+
+    @property
+    def rows(self):
+        """ The row (the index of the random variable) of every value. """
+        if self._rows is None:
+            self._rows = np.repeat(np.arange(len(self)), self.lengths)
+        return self._rows
+
+    def _sums(self, values):
+        """ Return the sums of *values* (an array aligned with ``xs``) over
+        each row. """
+        return np.bincount(self.rows, weights=values, minlength=len(self))
+
+    def _per_value(self, k):
+        """ Return *k*, which is either a scalar or an array with an entry per
+        row, as an array aligned with ``xs`` (or as a scalar). """
+        k = np.asarray(k)
+        if not k.ndim:
+            return k
+        if len(k) != len(self):
+            raise ValueError("Expected a scalar or {} values, got {}.".format(
+                len(self), len(k)))
+        return k[self.rows]
+
+    def _at(self, positions):
+        """ Return the values at *positions* (an index into ``xs`` per row),
+        as floats; the entries of rows without values are NaN. """
+        nonempty = self.lengths > 0
+        res = np.full(len(self), np.nan)
+        res[nonempty] = self.xs[positions[nonempty]]
+        return res
+
+    ## ----- Probability Methods ----- ##
+
+    def cdf(self, k):
+        """ Return the array of the cumulative distribution functions at *k*
+        (a scalar, or an array with a value per row). """
+        return self._sums(np.where(self.xs <= self._per_value(k), self.ps, 0))
+
+    def moment(self, n):
+        """ Return the array of the *n*'th non-central moments. """
+        return self._sums(self.ps * np.asarray(self.xs, dtype=float) ** n)
+
+    def pmf(self, k):
+        """ Return the array of the probability mass functions at *k* (a
+        scalar, or an array with a value per row). """
+        return self._sums(np.where(self.xs == self._per_value(k), self.ps, 0))
+
+    def sf(self, k):
+        """ Return the array of the survival functions at *k* (a scalar, or
+        an array with a value per row). """
+        return self._sums(np.where(self.xs > self._per_value(k), self.ps, 0))
+
+    ## ----- Descriptive Statistics ----- ##
+
+    @property
+    def max(self):
+        """ The maxima of the random variables (NaN for empty rows). """
+        return self._at(self.offsets[1:] - 1)
+
+    @property
+    def mean(self):
+        """ The means of the random variables. """
+        return self.moment(1)
+
+    @property
+    def min(self):
+        """ The minima of the random variables (NaN for empty rows). """
+        return self._at(self.offsets[:-1])
+
+    @property
+    def std(self):
+        """ The standard deviations of the random variables. """
+        return np.sqrt(self.variance)
+
+    @property
+    def variance(self):
+        """ The variances of the random variables. """
+        mean = self.mean
+        dev = np.asarray(self.xs, dtype=float) - mean[self.rows]
+        return self._sums(self.ps * dev ** 2)
+
+
+def from_drvs(drvs):
+    """ Return the :class:`DistributionTable` of the sequence *drvs* of random
+    variables. """
+    drvs = list(drvs)
+    lengths = [len(rv.xs) for rv in drvs]
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    if not drvs:
+        return DistributionTable(np.zeros(0, dtype=np.int64), np.zeros(0),
+                                 offsets, [])
+    xs = np.concatenate([np.asarray(rv.xs, dtype=np.int64) for rv in drvs])
+    ps = np.concatenate([np.asarray(rv.ps, dtype=float) for rv in drvs])
+    return DistributionTable(xs, ps, offsets, [rv.name for rv in drvs])
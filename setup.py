@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 
 data = {}
@@ -6,13 +6,15 @@ data['author'] = "Peleg Michaeli"
 data['author_email'] = 'freepeleg@gmail.com'
 data['name'] = "DRV"
 data['version'] = '0.1.2dev'
-data['packages'] = ['drv', 'drv.dice']
+data['packages'] = ['drv', 'drv.dice', 'drv.rpg', 'drv.rpg.systems']
 data['license'] = "UNLICENSE"
 data['description'] = "Discrete random variables in Python made easy."
 data['long_description'] = open('README.txt', 'r').read()
 data['url'] = "http://github.com/pelegm/drv"
 data['platforms'] = ["Linux"]
 data['requires'] = ['numpy', 'scipy']
+data['install_requires'] = ['numpy', 'scipy']
+data['entry_points'] = {'console_scripts': ['drv = drv.cli:main']}
 
 
 setup(**data)